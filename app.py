@@ -1,16 +1,24 @@
-from flask import Flask, jsonify, request, send_file, redirect, session, send_from_directory
+from flask import Flask, jsonify, request, redirect, session, send_from_directory, g, abort
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime,timezone,timedelta
 from collections import defaultdict
 import os, json, traceback, requests, re
 import threading
 import time
 import queue
-from pywebpush import webpush
+import asyncio
+from pywebpush import webpush, WebPushException
 import json
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
-from tennis_core import run_all
+from tennis_core import (
+    run_all, stream_all, diff_snapshots, slot_times, content_hash,
+    get_court_group, parse_time_content, parse_clock, SlotIndex, ALL_WEEKDAYS
+)
+import json_codec
+import profiling
+import hmac
 
 
 
@@ -18,7 +26,26 @@ from tennis_core import run_all
 # =========================
 # Flask 기본 설정
 # =========================
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify / request.json 을 json_codec 으로 처리
+    """
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            json_codec.dumps(obj, default=self.default),
+            mimetype=self.mimetype
+        )
+
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 #app.secret_key = os.environ.get("FLASK_SECRET", "tennis-secret")
 
 # =========================
@@ -33,12 +60,270 @@ db_initialized = False
 # =========================
 # 데이터베이스 연결
 # =========================
+DATABASE_SSLMODE = os.environ.get("DATABASE_SSLMODE", "require")
+
+
 def get_db():
     return psycopg2.connect(
         DATABASE_URL,
-        sslmode="require"
+        sslmode=DATABASE_SSLMODE
     )
 
+# =========================
+# 스키마 마이그레이션
+# =========================
+# 버전 순서대로 한 번씩만 적용된다 (schema_migrations 에 기록)
+
+# 날짜 파티션 테이블 → 파티션 키 컬럼
+PARTITIONED_TABLES = {
+    "baseline_slots": "date",
+    "sent_slots": "slot_date",
+}
+# 크롤링 범위(내일 ~ 다음달 말)를 덮도록 미리 만들어 둘 파티션 일수
+PARTITION_AHEAD_DAYS = 62
+# 여러 워커가 동시에 마이그레이션/정리하지 않도록 쓰는 advisory lock 키
+MIGRATION_LOCK_KEY = 20260113
+MAINTENANCE_LOCK_KEY = 20260114
+# slot_events 보관 일수 (지나면 정리 작업에서 삭제)
+SLOT_EVENT_RETENTION_DAYS = int(os.environ.get("SLOT_EVENT_RETENTION_DAYS", "90"))
+
+
+def migration_001_base_tables(cur):
+    # alarms 테이블
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS alarms (
+            id SERIAL PRIMARY KEY,
+            subscription_id TEXT NOT NULL,
+            court_group TEXT NOT NULL,
+            date TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE (subscription_id, court_group, date)
+        );
+    """)
+
+    # 🔥 push_subscriptions 테이블
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS push_subscriptions (
+            id TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            p256dh TEXT NOT NULL,
+            auth TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sent_slots (
+            subscription_id TEXT NOT NULL,
+            slot_key TEXT NOT NULL,
+            sent_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (subscription_id, slot_key)
+        );
+    """)
+
+    # ✅ baseline_slots 테이블 (이게 핵심)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS baseline_slots (
+            id SERIAL PRIMARY KEY,
+            subscription_id TEXT NOT NULL,
+            court_group TEXT NOT NULL,
+            date CHAR(8) NOT NULL,
+            time_content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE (subscription_id, court_group, date, time_content)
+        );
+    """)
+
+
+def migration_002_alarm_indexes(cur):
+    # refresh / cleanup 이 날짜 조건으로 alarms 를 읽으므로 date 인덱스
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS alarms_date_idx
+        ON alarms (date);
+    """)
+
+
+def is_partitioned(cur, table):
+    cur.execute("""
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = %s AND n.nspname = current_schema()
+    """, (table,))
+    row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def migration_003_date_partitions(cur):
+    """
+    baseline_slots / sent_slots → 날짜 LIST 파티션 테이블로 변환
+    (하루 만료 = 파티션 DROP)
+    """
+    if not is_partitioned(cur, "baseline_slots"):
+        cur.execute("ALTER TABLE baseline_slots RENAME TO baseline_slots_legacy")
+        cur.execute("""
+            CREATE TABLE baseline_slots (
+                subscription_id TEXT NOT NULL,
+                court_group TEXT NOT NULL,
+                date CHAR(8) NOT NULL,
+                time_content TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW(),
+                UNIQUE (subscription_id, court_group, date, time_content)
+            ) PARTITION BY LIST (date);
+        """)
+        cur.execute("""
+            CREATE TABLE baseline_slots_default
+            PARTITION OF baseline_slots DEFAULT
+        """)
+        cur.execute("""
+            INSERT INTO baseline_slots
+                (subscription_id, court_group, date, time_content, created_at)
+            SELECT subscription_id, court_group, date, time_content, created_at
+            FROM baseline_slots_legacy
+        """)
+        cur.execute("DROP TABLE baseline_slots_legacy")
+
+    if not is_partitioned(cur, "sent_slots"):
+        cur.execute("ALTER TABLE sent_slots RENAME TO sent_slots_legacy")
+        # slot_key = "group|YYYYMMDD|time" → 날짜를 별도 컬럼으로
+        cur.execute("""
+            CREATE TABLE sent_slots (
+                subscription_id TEXT NOT NULL,
+                slot_key TEXT NOT NULL,
+                slot_date CHAR(8) NOT NULL,
+                sent_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (subscription_id, slot_key, slot_date)
+            ) PARTITION BY LIST (slot_date);
+        """)
+        cur.execute("""
+            CREATE TABLE sent_slots_default
+            PARTITION OF sent_slots DEFAULT
+        """)
+        cur.execute("""
+            INSERT INTO sent_slots
+                (subscription_id, slot_key, slot_date, sent_at)
+            SELECT subscription_id, slot_key,
+                   LEFT(split_part(slot_key, '|', 2), 8), sent_at
+            FROM sent_slots_legacy
+            ON CONFLICT DO NOTHING
+        """)
+        cur.execute("DROP TABLE sent_slots_legacy")
+
+    # 1일 보관 정리용
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS sent_slots_sent_at_idx
+        ON sent_slots (sent_at);
+    """)
+
+
+def migration_004_slot_history(cur):
+    # 직전 크롤링 스냅샷 (재시작 후에도 diff 가 이어지도록)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS slot_snapshots (
+            cid TEXT NOT NULL,
+            date CHAR(8) NOT NULL,
+            content_hash TEXT NOT NULL,
+            times TEXT[] NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (cid, date)
+        );
+    """)
+
+    # 슬롯 추가/삭제 이벤트 (append-only)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS slot_events (
+            id BIGSERIAL PRIMARY KEY,
+            observed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            kind CHAR(1) NOT NULL,
+            cid TEXT NOT NULL,
+            date CHAR(8) NOT NULL,
+            time_content TEXT NOT NULL
+        );
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS slot_events_date_idx
+        ON slot_events (date, cid);
+    """)
+    # 시간순 append 이므로 BRIN 으로 충분
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS slot_events_observed_at_idx
+        ON slot_events USING BRIN (observed_at);
+    """)
+
+
+def migration_005_alarm_rules(cur):
+    """
+    알람 = 규칙 (날짜 범위 + 요일 마스크 + 시간대)
+    기존 단일 날짜 알람은 date_from = date_to = date, 전체 요일, 하루 전체
+    date 컬럼은 규칙의 마지막 날짜 (만료 정리용)
+    """
+    cur.execute("""
+        ALTER TABLE alarms
+            ADD COLUMN IF NOT EXISTS date_from CHAR(8),
+            ADD COLUMN IF NOT EXISTS date_to CHAR(8),
+            ADD COLUMN IF NOT EXISTS weekday_mask INTEGER NOT NULL DEFAULT 127,
+            ADD COLUMN IF NOT EXISTS time_from INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS time_to INTEGER NOT NULL DEFAULT 1440
+    """)
+    cur.execute("""
+        UPDATE alarms
+        SET date_from = date, date_to = date
+        WHERE date_from IS NULL
+    """)
+    cur.execute("""
+        ALTER TABLE alarms
+            ALTER COLUMN date_from SET NOT NULL,
+            ALTER COLUMN date_to SET NOT NULL
+    """)
+
+    cur.execute("""
+        ALTER TABLE alarms
+        DROP CONSTRAINT IF EXISTS alarms_subscription_id_court_group_date_key
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS alarms_rule_key
+        ON alarms (subscription_id, court_group, date_from, date_to,
+                   weekday_mask, time_from, time_to);
+    """)
+    # refresh: 신규 슬롯이 생긴 그룹의 아직 안 끝난 규칙만 조회
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS alarms_group_date_idx
+        ON alarms (court_group, date);
+    """)
+
+
+MIGRATIONS = [
+    (1, "base tables", migration_001_base_tables),
+    (2, "alarm indexes", migration_002_alarm_indexes),
+    (3, "date partitions for baseline_slots / sent_slots", migration_003_date_partitions),
+    (4, "slot snapshots and change events", migration_004_slot_history),
+    (5, "alarm rules (date range, weekdays, time window)", migration_005_alarm_rules),
+]
+
+
+def run_migrations(cur):
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    applied = {r[0] for r in cur.fetchall()}
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"[INFO] migration {version:03d} {description}")
+        migrate(cur)
+        cur.execute("""
+            INSERT INTO schema_migrations (version, description)
+            VALUES (%s, %s)
+        """, (version, description))
+
+
 # =========================
 # 데이터베이스 초기화
 # =========================
@@ -46,73 +331,28 @@ def init_db():
     print("🔥 init_db CALLED")
     with get_db() as conn:
         with conn.cursor() as cur:
-            # alarms 테이블
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS alarms (
-                    id SERIAL PRIMARY KEY,
-                    subscription_id TEXT NOT NULL,
-                    court_group TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    UNIQUE (subscription_id, court_group, date)
-                );
-            """)
-
-            # 🔥 push_subscriptions 테이블
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS push_subscriptions (
-                    id TEXT PRIMARY KEY,
-                    endpoint TEXT NOT NULL,
-                    p256dh TEXT NOT NULL,
-                    auth TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-            """)
-
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS sent_slots (
-                    subscription_id TEXT NOT NULL,
-                    slot_key TEXT NOT NULL,
-                    sent_at TIMESTAMP DEFAULT NOW(),
-                    PRIMARY KEY (subscription_id, slot_key)
-                );
-            """)
-
-            # ✅ baseline_slots 테이블 (이게 핵심)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS baseline_slots (
-                    id SERIAL PRIMARY KEY,
-                    subscription_id TEXT NOT NULL,
-                    court_group TEXT NOT NULL,
-                    date CHAR(8) NOT NULL,
-                    time_content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    UNIQUE (subscription_id, court_group, date, time_content)
-                );
-            """)
+            run_migrations(cur)
         conn.commit()
 
+DB_INIT_LOCK = threading.Lock()
+
+
 @app.before_request
 def ensure_db_initialized():
     global db_initialized
     if db_initialized:
         return
 
-    init_db()
-    db_initialized = True
+    # 스레드 워커: 첫 요청이 동시에 여러 개 들어와도 초기화는 한 번
+    with DB_INIT_LOCK:
+        if db_initialized:
+            return
+        init_db()
+        start_maintenance_thread()
+        db_initialized = True
 
 import hashlib
 
-def is_critical_window_kst(now_kst: datetime) -> bool:
-    """
-    매일 23:50 ~ 24:00(KST) 구간
-    """
-    return (
-        now_kst.hour == 23 and now_kst.minute >= 50
-    ) or (
-        now_kst.hour == 0 and now_kst.minute == 0
-    )
-
 def make_subscription_id(subscription):
     """
     Web Push subscription → 기기 고유 ID 생성
@@ -120,243 +360,813 @@ def make_subscription_id(subscription):
     endpoint = subscription.get("endpoint", "")
     return hashlib.sha256(endpoint.encode("utf-8")).hexdigest()
 
+# =========================
+# 앱 셸 / 정적 파일 버전 (콘텐츠 해시)
+# =========================
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SHELL_CACHE_CONTROL = "no-cache"
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def build_shell():
+    """
+    템플릿의 /static/*, /sw.js 참조를 ?v=<해시> URL 로 바꿔 한 번만 만들어 둠
+    """
+    static_versions = {
+        name: file_hash(os.path.join(app.root_path, "static", name))
+        for name in sorted(os.listdir(os.path.join(app.root_path, "static")))
+        if name != "sw.js"
+    }
+
+    with open(os.path.join(app.root_path, "ios_template.html"), "r", encoding="utf-8") as f:
+        html = f.read()
+
+    for name, v in static_versions.items():
+        html = html.replace(f'"/static/{name}"', f'"/static/{name}?v={v}"')
+
+    shell_version = hashlib.sha256(
+        (html + file_hash(os.path.join(app.root_path, "static", "sw.js"))).encode("utf-8")
+    ).hexdigest()[:12]
+    html = html.replace('"/sw.js"', f'"/sw.js?v={shell_version}"')
+
+    return {
+        "version": shell_version,
+        "static": static_versions,
+        "html": html.encode("utf-8"),
+        "urls": ["/"] + [
+            f"/static/{name}?v={v}" for name, v in static_versions.items()
+        ],
+    }
+
+
+SHELL = build_shell()
+
+
+@app.after_request
+def set_cache_headers(response):
+    # 해시가 맞는 정적 파일만 장기 캐시
+    if request.path.startswith("/static/"):
+        name = request.path[len("/static/"):]
+        if request.args.get("v") and request.args.get("v") == SHELL["static"].get(name):
+            response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+    return response
+
+# =========================
+# 프로파일링 (opt-in)
+# =========================
+# PROFILE_REQUESTS=1 → 대상 경로 전부, 아니면 관리자 ?profile=1 요청만
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS") == "1"
+# /refresh 는 백그라운드 스레드에서 돌기 때문에 refresh_job 이 직접 프로파일링
+PROFILED_PATHS = {"/data"}
+
+
+def is_admin():
+    # 쿼리스트링 토큰은 access log 에 남으므로 헤더만 허용
+    token = request.headers.get("X-Admin-Token") or ""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+@app.before_request
+def start_profiling():
+    if request.path not in PROFILED_PATHS:
+        return
+    if not PROFILE_REQUESTS and not (request.args.get("profile") == "1" and is_admin()):
+        return
+
+    g.profiler = profiling.Profiler(request.path.strip("/")).start()
+
+
+@app.teardown_request
+def stop_profiling(exc):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+
+    try:
+        profiler.stop()
+        name = profiler.save()
+        print(f"[INFO] profile saved: {name} ({profiler.elapsed:.2f}s, {profiler.samples} samples)")
+    except Exception as e:
+        print("[ERROR] profile save failed", e)
+
+
+@app.route("/admin/profiles")
+def profile_list():
+    if not is_admin():
+        abort(404)
+    return jsonify(profiling.list_reports())
+
+
+@app.route("/admin/profiles/<name>")
+def profile_download(name):
+    if not is_admin():
+        abort(404)
+    if name not in profiling.list_reports():
+        abort(404)
+    return send_from_directory(profiling.PROFILE_DIR, name, as_attachment=True)
+
 # =========================
 # 서비스워커 제공
 # =========================
 
 @app.route("/sw.js")
 def service_worker():
-    return send_from_directory("static", "sw.js")
+    response = send_from_directory("static", "sw.js", max_age=0)
+    # 서비스워커는 항상 재검증해야 업데이트가 잡힘
+    response.headers["Cache-Control"] = SHELL_CACHE_CONTROL
+    return response
+
+
+@app.route("/shell.json")
+def shell_manifest():
+    """
+    서비스워커 precache 목록
+    """
+    response = jsonify({"version": SHELL["version"], "urls": SHELL["urls"]})
+    response.headers["Cache-Control"] = SHELL_CACHE_CONTROL
+    return response
 
 # =========================
 # 전역 캐시
 # =========================
-CACHE = {
-    "facilities": {},
-    "availability": {},
-    "updated_at": None
-}
+# 읽기 쪽은 CACHE 를 한 번만 참조하고, 갱신은 새 dict 로 통째로 교체
+# (필드 단위로 바꾸지 않으므로 스레드끼리 반쯤 바뀐 캐시를 보지 않음)
+def build_cache(facilities, availability, updated_at):
+    """
+    /data 응답 본문도 여기서 한 번만 인코딩
+    """
+    payload = json_codec.dumps({
+        "facilities": facilities,
+        "availability": availability,
+        "updated_at": updated_at
+    })
+    return {
+        "facilities": facilities,
+        "availability": availability,
+        "updated_at": updated_at,
+        "payload": payload,
+        "etag": hashlib.sha256((updated_at or "").encode("utf-8")).hexdigest()[:16],
+    }
+
+
+def publish_cache(facilities, availability):
+    global CACHE
+    CACHE = build_cache(facilities, availability, datetime.now(KST).isoformat())
+    return CACHE
+
+
+# 첫 refresh 전에도 /data 본문은 항상 올바른 JSON (updated_at 은 None)
+CACHE = build_cache({}, {}, None)
 
 # =========================
 # 메인 페이지
 # =========================
 @app.route("/")
 def index():
-    return send_file("ios_template.html")
+    response = app.response_class(SHELL["html"], mimetype="text/html")
+    response.headers["Cache-Control"] = SHELL_CACHE_CONTROL
+    response.set_etag(SHELL["version"])
+    return response.make_conditional(request)
 
 # =========================
 # 데이터 API
 # =========================
 @app.route("/data")
 def data():
-    if not CACHE["updated_at"]:
-        try:
-            facilities, raw_availability = crawl_all()
-            availability = {}
-            for cid, days in raw_availability.items():
-                availability[cid] = {}
-                for date, slots in days.items():
-                    availability[cid][date] = []
-                    for s in slots:
-                        availability[cid][date].append({
-                            "timeContent": s.get("timeContent"),
-                            "resveId": s.get("resveId")   # 🔥 이 줄이 핵심
-                        })
-
-            CACHE["facilities"] = facilities
-            CACHE["availability"] = availability
-            CACHE["updated_at"] = datetime.now(KST).isoformat()
-
-        except Exception:
-            pass
-
-    return jsonify({
-        "facilities": CACHE["facilities"],
-        "availability": CACHE["availability"],
-        "updated_at": CACHE["updated_at"]
-
-    })
+    cache = CACHE
+    if not cache["updated_at"]:
+        # 서버 시작 직후: 백그라운드 refresh 를 잠깐만 기다리고, 안 끝나면 503 + Retry-After
+        # (오래 기다리면 동시에 들어온 요청이 gthread 워커를 다 잡아 다른 API 까지 막힘)
+        job, _ = start_refresh()
+        job["done"].wait(DATA_COLD_WAIT_SEC)
+        cache = CACHE
+
+    if not cache["updated_at"]:
+        # 아직 데이터 없음 → 빈 문서 + 503 (서비스워커는 ok 응답만 캐시)
+        response = app.response_class(cache["payload"], status=503, mimetype="application/json")
+        response.headers["Cache-Control"] = "no-store"
+        response.headers["Retry-After"] = "10"
+        return response
+
+    response = app.response_class(cache["payload"], mimetype="application/json")
+    # 서비스워커가 버전 비교에 사용
+    response.headers["X-Data-Version"] = cache["updated_at"]
+    response.headers["Cache-Control"] = SHELL_CACHE_CONTROL
+    response.set_etag(cache["etag"])
+    return response.make_conditional(request)
 
 # =========================
 # 크롤링 갱신 (UptimeRobot)
 # =========================
+# 요청 스레드는 작업만 시작하고 바로 응답, 실제 작업은 refresh 스레드 하나에서
+# (이미 돌고 있으면 새로 시작하지 않음)
+DATA_COLD_WAIT_SEC = float(os.environ.get("DATA_COLD_WAIT_SEC", "3"))
+# /refresh?wait=1 최대 대기 (요청 스레드를 무한정 잡지 않도록)
+REFRESH_WAIT_SEC = int(os.environ.get("REFRESH_WAIT_SEC", "120"))
+REFRESH_LOCK = threading.Lock()
+REFRESH_STATE = {
+    "job": None,
+    "last_result": None,
+    "last_duration": None,
+    "last_finished_at": None,
+}
+
+
 @app.route("/refresh")
 def refresh():
+    profile = PROFILE_REQUESTS or (request.args.get("profile") == "1" and is_admin())
+    job, started = start_refresh(request.args.get("test"), profile)
+
+    # ?wait=1 → 끝날 때까지 기다렸다가 결과 반환 (수동 확인 / 부하 테스트용)
+    if request.args.get("wait") == "1":
+        if not job["done"].wait(REFRESH_WAIT_SEC):
+            return "still running", 202
+        return job["result"]
+
+    return ("accepted", 202) if started else ("already running", 202)
+
+
+@app.route("/refresh/status")
+def refresh_status():
+    job = REFRESH_STATE["job"]
+    return jsonify({
+        "running": bool(job and not job["done"].is_set()),
+        "updated_at": CACHE["updated_at"],
+        "last_result": REFRESH_STATE["last_result"],
+        "last_duration": REFRESH_STATE["last_duration"],
+        "last_finished_at": REFRESH_STATE["last_finished_at"],
+    })
+
+
+def start_refresh(test=None, profile=False):
+    with REFRESH_LOCK:
+        job = REFRESH_STATE["job"]
+        if job and not job["done"].is_set():
+            return job, False
+
+        job = {"done": threading.Event(), "result": None}
+        REFRESH_STATE["job"] = job
+
+    threading.Thread(
+        target=refresh_job,
+        args=(job, test, profile),
+        name="refresh",
+        daemon=True
+    ).start()
+    return job, True
+
+
+def refresh_job(job, test, profile):
+    # 알람 스레드 / executor 스레드도 같이 샘플링
+    profiler = profiling.Profiler("refresh", spawned=True).start() if profile else None
+    started = time.perf_counter()
+    try:
+        job["result"] = run_refresh(test)
+    except Exception as e:
+        print("[ERROR] refresh failed", e)
+        traceback.print_exc()
+        job["result"] = ("refresh failed", 500)
+    finally:
+        REFRESH_STATE["last_result"] = list(job["result"])
+        REFRESH_STATE["last_duration"] = round(time.perf_counter() - started, 3)
+        REFRESH_STATE["last_finished_at"] = datetime.now(KST).isoformat()
+        job["done"].set()
+
+    # 리포트 저장 실패(디스크 등)가 refresh 상태에 영향 주지 않도록 done 이후에
+    if profiler:
+        try:
+            profiler.stop()
+            print(f"[INFO] profile saved: {profiler.save()}")
+        except Exception as e:
+            print("[ERROR] profile save failed", e)
+
+
+def run_refresh(test=None):
     print("[INFO] refresh start")
 
-    with get_db() as conn:
-        with conn.cursor() as cur:
-            cleanup_old_alarm_data(cur)
-        conn.commit()
+    today = datetime.now(KST).strftime("%Y%m%d")
+
+    # 🔥 테스트 모드: ?test=1
+    injectors = []
+    if test == "1":
+        injectors.append(inject_test_slot_1)
+    if test == "2":
+        injectors.append(inject_test_slot_2)
+
+    try:
+        # 🔍 결과가 도착하는 대로 직전 스냅샷과 비교 → 신규 슬롯은 바로 알람 스레드로
+        pipeline = RefreshPipeline(load_previous_snapshot(today), today, injectors)
+    except Exception as e:
+        print("[ERROR] snapshot load failed", e)
+        traceback.print_exc()
+        return "snapshot failed", 500
+
     try:
-        facilities, availability = crawl_all()
-        court_group_map = build_court_group_map(facilities)
+        stream_all(pipeline.on_result, pipeline.on_facilities)
     except Exception as e:
+        pipeline.abort()
         print("[ERROR] crawl failed", e)
         return "crawl failed", 500
 
-    # 🔥 테스트 모드: ?test=1
-    if request.args.get("test") == "1":
-        inject_test_slot_1(facilities, availability)
-    if request.args.get("test") == "2":
-        inject_test_slot_2(facilities, availability)
-    if request.args.get("test") == "3":
+    pipeline.finish()
+    if pipeline.error:
+        # 알람 단계 실패여도 캐시 갱신 / 스냅샷 저장은 진행
+        print("[ERROR] alarm stage failed", pipeline.error)
+
+    print(f"[INFO] diff: {len(pipeline.changed)} keys changed, {pipeline.event_count} events")
+
+    if test == "3":
         with get_db() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM push_subscriptions LIMIT 1")
                 s = cur.fetchone()
 
         if s:
-            send_push_notification(
-                {
-                    "endpoint": s["endpoint"],
-                    "keys": {
-                        "p256dh": s["p256dh"],
-                        "auth": s["auth"]
-                    }
-                },
-                title="🎾 예약 가능 알림 테스트",
-                body="정상 동작 확인"
-            )
+            try:
+                send_push_notification(
+                    {
+                        "endpoint": s["endpoint"],
+                        "keys": {
+                            "p256dh": s["p256dh"],
+                            "auth": s["auth"]
+                        }
+                    },
+                    title="🎾 예약 가능 알림 테스트",
+                    body="정상 동작 확인"
+                )
+            except Exception as e:
+                print("[TEST] push failed", e)
         else:
             print("[TEST] push_subscriptions 비어 있음")
+
+    cache = None
     try:
-        new_availability = {}
-        for cid, days in availability.items():
-            new_availability[cid] = {}
-            for date, slots in days.items():
-                new_availability[cid][date] = []
-                for s in slots:
-                    new_availability[cid][date].append({
-                    "timeContent": s.get("timeContent"),
-                    "resveId": s.get("resveId"),
-                    })
-        CACHE["facilities"] = facilities
-        CACHE["availability"] = new_availability
-        CACHE["updated_at"] = datetime.now(KST).isoformat()
+        cache = publish_cache(pipeline.facilities, pipeline.availability)
         print("[INFO] CACHE updated in /refresh")
     except Exception as e:
         print("[ERROR] cache update failed", e)
-    
-    # ✅ 여기!
-    court_group_map = build_court_group_map(facilities)
-    current_slots = flatten_slots(facilities, availability)
 
     try:
         with get_db() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM alarms")
-                alarms = cur.fetchall()
+            with conn.cursor() as cur:
+                save_snapshot_changes(cur, pipeline.snapshot, pipeline.changed)
+            conn.commit()
 
-                cur.execute("SELECT * FROM push_subscriptions")
-                subs = cur.fetchall()
+        # 스냅샷과 CACHE 를 같은 세대로 묶음 (저장/캐시 갱신 중 하나라도 실패하면 세대 불일치)
+        set_slot_snapshot(pipeline.snapshot, cache["updated_at"] if cache else None)
 
-                # ✅ subs_map 정의 (id -> subscription dict)
-                subs_map = {}
-                for s in subs:
-                    subs_map[s["id"]] = {
-                        "endpoint": s["endpoint"],
-                        "keys": {"p256dh": s["p256dh"], "auth": s["auth"]},
-                    }
-
-                fired = 0
-
-                for alarm in alarms:
-                    subscription_id = alarm["subscription_id"]
-                    alarm_group = alarm["court_group"]
-                    alarm_date = alarm["date"]
-
-                    group_cids = court_group_map.get(alarm_group, [])
-                    if not group_cids:
-                        continue
-
-                    # 🔑 이 알람(사람+코트+날짜)의 baseline 로드
-                    cur.execute("""
-                        SELECT time_content
-                        FROM baseline_slots
-                        WHERE subscription_id = %s
-                        AND court_group = %s
-                        AND date = %s
-                    """, (subscription_id, alarm_group, alarm_date))
-
-                    baseline = {r["time_content"] for r in cur.fetchall()}
-
-                    # 🔥 최초 refresh → baseline 초기화만 하고 알람 ❌
-                    if not baseline:
-                        times = {
-                            slot["time"]
-                            for slot in current_slots
-                            if slot["cid"] in group_cids and slot["date"] == alarm_date
-                        }
-                        for t in times:
-                            add_to_baseline(cur, subscription_id, alarm_group, alarm_date, t)
-                        continue
-                            # ❗ 최초 refresh에서는 절대 알람 안 울림
-                    print("DEBUG alarm:", subscription_id, alarm_group, alarm_date)
-                    print("DEBUG group_cids:", group_cids)
-
-                    for slot in current_slots:
-                        if slot["date"] == alarm_date:
-                            print("DEBUG slot:", slot["cid"], slot["date"], slot["time"])
-
-                    # 🔔 이후 refresh → 신규 슬롯만 알람
-                    for slot in current_slots:
-                        if slot["cid"] not in group_cids:
-                            continue
-                        if slot["date"] != alarm_date:
-                            continue
-                        if slot["time"] in baseline:
-                            continue
-
-                        sub = subs_map.get(subscription_id)
-                        if not sub:
-                            continue
-
-                        # 중복 발송 방지 (group 기준)
-                        slot_key = f"{alarm_group}|{alarm_date}|{slot['time']}"
-
-                        cur.execute("""
-                            SELECT 1 FROM sent_slots
-                            WHERE subscription_id=%s AND slot_key=%s
-                        """, (subscription_id, slot_key))
-                        if cur.fetchone():
-                            continue
-
-                        # 🔔 알람 발송
-                        send_push_notification(
-                            sub,
-                            title="🎾 예약 가능 알림",
-                            body=f"{alarm_group} {alarm_date} {slot['time']}"
+    except Exception as e:
+        print("[ERROR] snapshot save failed", e)
+        traceback.print_exc()
+        return "snapshot failed", 500
+
+    print(f"[INFO] refresh done (fired={pipeline.fired})")
+    if pipeline.error:
+        return "alarm failed", 500
+    return "ok", 200
+
+
+# =========================
+# 스트리밍 refresh 파이프라인
+# =========================
+# 크롤링 → (diff + 캐시 구성) → 알람 스레드
+# 단계 사이 큐 크기를 제한해서 알람 처리가 밀리면 크롤링도 같이 기다림
+ALARM_QUEUE_SIZE = int(os.environ.get("ALARM_QUEUE_SIZE", "64"))
+ALARM_FLUSH_SEC = int(os.environ.get("ALARM_FLUSH_MS", "500")) / 1000
+
+
+class RefreshPipeline:
+    def __init__(self, prev_snapshot, today, injectors=()):
+        self.prev = prev_snapshot          # None → 최초 refresh (알람 ❌)
+        self.today = today
+        self.injectors = injectors
+        self.extra = {}                    # 테스트 주입 슬롯 {(cid, date): [...]}
+        # 메모리 스냅샷이 CACHE 와 같은 세대일 때만 기존 슬롯 리스트 재사용
+        cache, snapshot = CACHE, SLOT_SNAPSHOT
+        self.reuse_cache = (
+            snapshot["slots"] is not None
+            and snapshot["generation"] is not None
+            and snapshot["generation"] == cache["updated_at"]
+        )
+        self.old_availability = cache["availability"]
+
+        self.facilities = {}
+        self.snapshot = {}
+        self.availability = {}
+        self.changed = set()
+        self.event_count = 0
+        self.fired = 0
+        self.error = None
+
+        self.alarm_queue = queue.Queue(maxsize=ALARM_QUEUE_SIZE)
+        self.worker = None
+
+    # ---- 크롤링 콜백 ----
+    def on_facilities(self, facilities):
+        self.facilities = facilities
+
+        injected = {}
+        for inject in self.injectors:
+            inject(facilities, injected)
+        for cid, days in injected.items():
+            for date, slots in days.items():
+                self.extra[(cid, date)] = slots
+
+        self.worker = threading.Thread(
+            target=self.alarm_worker,
+            name="refresh-alarms",
+            daemon=True
+        )
+        self.worker.start()
+
+    def on_result(self, cid, date, slots):
+        slots = slots + self.extra.pop((cid, date), [])
+        times = slot_times(slots)
+        if not times:
+            return
+
+        key = (cid, date)
+        entry = (content_hash(times), times)
+        self.snapshot[key] = entry
+        prev = self.prev or {}
+
+        old_slots = self.old_availability.get(cid, {}).get(date)
+        if self.reuse_cache and old_slots is not None and prev.get(key, (None,))[0] == entry[0]:
+            self.availability.setdefault(cid, {})[date] = old_slots
+            return
+
+        self.availability.setdefault(cid, {})[date] = [slim_slot(s) for s in slots]
+
+        if self.prev is None:
+            self.changed.add(key)
+            return
+
+        events, changed = diff_snapshots({key: prev[key]} if key in prev else {}, {key: entry})
+        self.changed |= changed
+        return self.emit(events)
+
+    def finish(self):
+        """
+        스냅샷/캐시 구성을 마무리하고 알람 스레드를 닫음
+        알람 단계 오류는 여기서 올리지 않고 self.error 로만 남김 (캐시/스냅샷 저장은 계속)
+        """
+        try:
+            # 크롤링 결과에 없던 테스트 슬롯
+            for cid, date in list(self.extra):
+                self.on_result(cid, date, [])
+
+            # 이번에 안 보인 키 → 삭제 이벤트
+            if self.prev is not None:
+                gone = {k: v for k, v in self.prev.items() if k not in self.snapshot}
+                events, changed = diff_snapshots(gone, {})
+                self.changed |= changed
+                self.emit(events)
+        finally:
+            self.stop_worker()
+
+    def abort(self):
+        self.stop_worker()
+
+    # ---- 알람 단계 ----
+    def emit(self, events):
+        """
+        크롤링 이벤트 루프 안에서는 블로킹 put 대신
+        큐가 찼을 때만 executor 로 넘긴 future 를 돌려줌 (stream_availability 가 await)
+        """
+        if not events:
+            return None
+        self.event_count += len(events)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.alarm_queue.put(events)
+            return None
+
+        try:
+            self.alarm_queue.put_nowait(events)
+            return None
+        except queue.Full:
+            return loop.run_in_executor(None, self.alarm_queue.put, events)
+
+    def stop_worker(self):
+        if self.worker is None:
+            return
+        self.alarm_queue.put(None)
+        self.worker.join()
+        self.worker = None
+
+    def alarm_worker(self):
+        conn = None
+        done = False
+        try:
+            conn = get_db()
+            group_of = {
+                cid: group
+                for group, cids in build_court_group_map(self.facilities).items()
+                for cid in cids
+            }
+            while not done:
+                # 첫 배치 후 ALARM_FLUSH_SEC 동안 들어온 배치를 모아서 한 번에 처리
+                # (그룹 인덱스 / 규칙 조회 / 커밋은 flush 당 한 번)
+                events = []
+                batch = self.alarm_queue.get()
+                deadline = time.monotonic() + ALARM_FLUSH_SEC
+                while batch is not None:
+                    events += batch
+                    try:
+                        batch = self.alarm_queue.get(
+                            timeout=max(deadline - time.monotonic(), 0)
                         )
-                        fired += 1
-                        print(f"[INFO] push sent to {subscription_id} | {alarm_group} | {alarm_date} | {slot['time']}")
-
-                        # 기록
-                        add_to_baseline(
-                            cur,
-                            subscription_id,
-                            alarm_group,
-                            alarm_date,
-                            slot["time"]
+                    except queue.Empty:
+                        break
+                done = batch is None
+                if not events:
+                    continue
+
+                # 이력은 알람 발송과 별도 트랜잭션 (알람 쪽이 실패해도 이력은 남김)
+                with conn.cursor() as cur:
+                    append_slot_events(cur, events)
+                conn.commit()
+
+                try:
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        self.fired += process_alarm_events(
+                            cur, group_of, events, self.today
                         )
-                        baseline.add(slot["time"])
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print("[ERROR] alarm flush failed", e)
+                    traceback.print_exc()
+                    self.error = self.error or e
+
+        except Exception as e:
+            self.error = e
+            # 크롤링 쪽이 put 에서 막히지 않도록 끝까지 비움
+            while not done and self.alarm_queue.get() is not None:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
 
-                        cur.execute("""
-                            INSERT INTO sent_slots (subscription_id, slot_key)
-                            VALUES (%s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (subscription_id, slot_key))
 
+# =========================
+# 스냅샷 / 변경 이벤트
+# =========================
+# generation = 같은 크롤링 결과로 만든 CACHE 의 updated_at
+SLOT_SNAPSHOT = {"slots": None, "generation": None}
 
-            conn.commit()
 
-        print(f"[INFO] refresh done (fired={fired})")
-        return "ok"
+def set_slot_snapshot(slots, generation):
+    global SLOT_SNAPSHOT
+    SLOT_SNAPSHOT = {"slots": slots, "generation": generation}
 
-    except Exception as e:
-        print("[ERROR] push notification failed", e)
-        traceback.print_exc()
-        return "push failed", 500
+
+def load_previous_snapshot(today):
+    """
+    메모리 → 없으면 DB. 오늘 이전 날짜는 만료라서 비교에서 제외
+    """
+    slots = SLOT_SNAPSHOT["slots"]
+    if slots is None:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT cid, date, content_hash, times
+                    FROM slot_snapshots
+                    WHERE date > %s
+                """, (today,))
+                rows = cur.fetchall()
+        if not rows:
+            return None
+        slots = {(cid, date): (h, list(times)) for cid, date, h, times in rows}
+
+    return {k: v for k, v in slots.items() if k[1] > today}
+
+
+def save_snapshot_changes(cur, snapshot, changed):
+    upserts = [
+        (cid, date, snapshot[(cid, date)][0], snapshot[(cid, date)][1])
+        for cid, date in changed if (cid, date) in snapshot
+    ]
+    removed = [
+        (cid, date) for cid, date in changed if (cid, date) not in snapshot
+    ]
+
+    if upserts:
+        execute_values(cur, """
+            INSERT INTO slot_snapshots (cid, date, content_hash, times)
+            VALUES %s
+            ON CONFLICT (cid, date)
+            DO UPDATE SET
+              content_hash = EXCLUDED.content_hash,
+              times = EXCLUDED.times,
+              updated_at = NOW()
+        """, upserts)
+    if removed:
+        execute_values(cur, """
+            DELETE FROM slot_snapshots s
+            USING (VALUES %s) AS r (cid, date)
+            WHERE s.cid = r.cid AND s.date = r.date
+        """, removed)
+
+
+def append_slot_events(cur, events):
+    if not events:
+        return
+    execute_values(cur, """
+        INSERT INTO slot_events (kind, cid, date, time_content)
+        VALUES %s
+    """, events)
+
+
+def slim_slot(s):
+    """
+    캐시에 남길 필드 + 분 단위 시간 구간 (start, end)
+    """
+    rng = parse_time_content(s.get("timeContent"))
+    return {
+        "timeContent": s.get("timeContent"),
+        "resveId": s.get("resveId"),
+        "start": rng[0] if rng else None,
+        "end": rng[1] if rng else None,
+    }
+
+
+def process_alarm_events(cur, group_of, events, today):
+    """
+    신규(A) 슬롯 이벤트로 (group, date) 인덱스를 만들고
+    해당 그룹의 알람 규칙을 규칙당 한 번씩 인덱스에 대해 평가
+    group_of: {cid: court_group} (refresh 당 한 번 계산)
+    """
+    index = SlotIndex()
+    for kind, cid, date, time_content in events:
+        group = group_of.get(cid)
+        if kind == "A" and group and date >= today:
+            index.add(group, date, time_content)
+
+    if not index:
+        return 0
+    index.freeze()
+    first_date, last_date = index.date_bounds()
+
+    cur.execute("""
+        SELECT a.subscription_id, a.court_group,
+               a.date_from, a.date_to, a.weekday_mask, a.time_from, a.time_to,
+               p.endpoint, p.p256dh, p.auth
+        FROM alarms a
+        JOIN push_subscriptions p ON p.id = a.subscription_id
+        WHERE a.court_group = ANY(%s)
+          AND a.date >= %s
+          AND a.date_from <= %s
+    """, (index.groups(), first_date, last_date))
+    alarms = cur.fetchall()
+
+    fired = 0
+    expired = set()
+    for alarm in alarms:
+        subscription_id = alarm["subscription_id"]
+        alarm_group = alarm["court_group"]
+        if subscription_id in expired:
+            continue
+
+        matches = list(index.match(
+            alarm_group,
+            max(alarm["date_from"], today),
+            alarm["date_to"],
+            alarm["weekday_mask"],
+            alarm["time_from"],
+            alarm["time_to"],
+        ))
+        if not matches:
+            continue
+
+        # 🔑 알람 등록 시점에 이미 있던 슬롯
+        cur.execute("""
+            SELECT date, time_content
+            FROM baseline_slots
+            WHERE subscription_id = %s
+            AND court_group = %s
+            AND date = ANY(%s)
+        """, (subscription_id, alarm_group, sorted({d for d, _ in matches})))
+        baseline = {(r["date"], r["time_content"]) for r in cur.fetchall()}
+
+        sub = {
+            "endpoint": alarm["endpoint"],
+            "keys": {"p256dh": alarm["p256dh"], "auth": alarm["auth"]},
+        }
+
+        # 🔔 신규 슬롯만 알람
+        for alarm_date, t in matches:
+            if (alarm_date, t) in baseline:
+                continue
+
+            # 중복 발송 방지 (group 기준, 규칙이 여러 개여도 한 번)
+            slot_key = f"{alarm_group}|{alarm_date}|{t}"
+
+            cur.execute("""
+                SELECT 1 FROM sent_slots
+                WHERE subscription_id=%s AND slot_key=%s AND slot_date=%s
+            """, (subscription_id, slot_key, alarm_date))
+            if cur.fetchone():
+                continue
+
+            # 발송 실패는 이 구독만 건너뛰고 계속 (refresh 전체를 실패시키지 않음)
+            try:
+                send_push_notification(
+                    sub,
+                    title="🎾 예약 가능 알림",
+                    body=f"{alarm_group} {alarm_date} {t}"
+                )
+            except WebPushException as e:
+                status = getattr(e.response, "status_code", None)
+                print(f"[WARN] push failed ({status}) {subscription_id} | {e}")
+                if status in PUSH_GONE_STATUS:
+                    expired.add(subscription_id)
+                    break
+                continue
+            except Exception as e:
+                print(f"[WARN] push failed {subscription_id} | {e}")
+                continue
+            fired += 1
+            print(f"[INFO] push sent to {subscription_id} | {alarm_group} | {alarm_date} | {t}")
+
+            # 기록
+            add_to_baseline(cur, subscription_id, alarm_group, alarm_date, t)
+
+            cur.execute("""
+                INSERT INTO sent_slots (subscription_id, slot_key, slot_date)
+                VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, (subscription_id, slot_key, alarm_date))
+
+    if expired:
+        delete_subscriptions(cur, sorted(expired))
+        print(f"[INFO] expired subscriptions removed: {len(expired)}")
+
+    return fired
+
+
+# 만료/해지된 구독 (push 서비스가 404 / 410 응답)
+PUSH_GONE_STATUS = {404, 410}
+
+
+def delete_subscriptions(cur, subscription_ids):
+    cur.execute("""
+        DELETE FROM alarms WHERE subscription_id = ANY(%s)
+    """, (subscription_ids,))
+    cur.execute("""
+        DELETE FROM push_subscriptions WHERE id = ANY(%s)
+    """, (subscription_ids,))
+
+
+# =========================
+# 슬롯 변경 이력 조회 API
+# =========================
+HISTORY_PAGE_SIZE = 5000
+
+
+@app.route("/history")
+def history():
+    """
+    ?from=YYYYMMDD&to=YYYYMMDD[&after_id=N]
+    한 번에 HISTORY_PAGE_SIZE 건, 더 있으면 next_after_id 로 이어서 조회
+    """
+    date_from = (request.args.get("from") or "").replace("-", "")
+    date_to = (request.args.get("to") or date_from).replace("-", "")
+    if not date_from:
+        return jsonify({"error": "from required"}), 400
+    if not re.fullmatch(r"\d{8}", date_from) or not re.fullmatch(r"\d{8}", date_to):
+        return jsonify({"error": "invalid date"}), 400
+    try:
+        after_id = int(request.args.get("after_id") or 0)
+    except ValueError:
+        return jsonify({"error": "invalid after_id"}), 400
+
+    with get_db() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, observed_at, kind, cid, date, time_content
+                FROM slot_events
+                WHERE date BETWEEN %s AND %s
+                  AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (date_from, date_to, after_id, HISTORY_PAGE_SIZE + 1))
+            rows = cur.fetchall()
+
+    truncated = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    return jsonify({
+        "events": rows,
+        "truncated": truncated,
+        "next_after_id": rows[-1]["id"] if truncated else None,
+    })
 
 # =========================
 # Push 구독 저장 API
@@ -396,34 +1206,106 @@ def push_subscribe():
 # =========================
 @app.route("/alarm/add", methods=["POST"])
 def alarm_add():
+    """
+    body: subscription_id, court_group 과
+      - date: "2025-12-22"                (단일 날짜)
+      - 또는 date_from / date_to          (날짜 범위)
+      - weekdays: [0..6] (0=월, 선택)
+      - time_from / time_to: "19:00" (선택, 슬롯이 이 구간 안에 있어야 함)
+    """
     data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "invalid request"}), 400
 
     subscription_id = data.get("subscription_id")
     court_group = data.get("court_group")
-    date_raw = data.get("date")   # "2025-12-22"
+    rule = parse_alarm_rule(data)
 
-    if not subscription_id or not court_group or not date_raw:
+    if (
+        not isinstance(subscription_id, str) or not subscription_id
+        or not isinstance(court_group, str) or not court_group
+        or not rule
+    ):
         return jsonify({"error": "invalid request"}), 400
 
-    # 날짜 포맷 통일 (YYYYMMDD)
-    date = date_raw.replace("-", "")
-
     try:
         with get_db() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    INSERT INTO alarms (subscription_id, court_group, date)
-                    VALUES (%s, %s, %s)
+                    INSERT INTO alarms
+                        (subscription_id, court_group, date,
+                         date_from, date_to, weekday_mask, time_from, time_to)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     ON CONFLICT DO NOTHING
-                """, (subscription_id, court_group, date))
+                    RETURNING id
+                """, (
+                    subscription_id, court_group, rule["date_to"],
+                    rule["date_from"], rule["date_to"], rule["weekday_mask"],
+                    rule["time_from"], rule["time_to"]
+                ))
+                row = cur.fetchone()
+                if row is None:
+                    return jsonify({"status": "duplicate"})
+
+                # 🔑 등록 시점에 이미 열린 슬롯은 baseline (알람 ❌)
+                for date, t in current_rule_slots(court_group, rule):
+                    add_to_baseline(cur, subscription_id, court_group, date, t)
             conn.commit()
 
-        return jsonify({"status": "added"})
+        return jsonify({"status": "added", "id": row[0]})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+MAX_ALARM_DAYS = 62
+ALARM_TEXT_FIELDS = ("date", "date_from", "date_to", "time_from", "time_to")
+
+
+def parse_alarm_rule(data):
+    # 문자열이 아닌 값은 형식 오류 (→ 400)
+    if any(data.get(k) is not None and not isinstance(data[k], str) for k in ALARM_TEXT_FIELDS):
+        return None
+
+    date_from = (data.get("date_from") or data.get("date") or "").replace("-", "")
+    date_to = (data.get("date_to") or date_from).replace("-", "")
+    if not re.fullmatch(r"\d{8}", date_from) or not re.fullmatch(r"\d{8}", date_to):
+        return None
+
+    try:
+        span = datetime.strptime(date_to, "%Y%m%d") - datetime.strptime(date_from, "%Y%m%d")
+    except ValueError:
+        return None
+    if span.days < 0 or span.days > MAX_ALARM_DAYS:
+        return None
+
+    weekdays = data.get("weekdays")
+    if weekdays is None:
+        weekday_mask = ALL_WEEKDAYS
+    else:
+        # 0(월) ~ 6(일) 정수 리스트만 허용
+        if not isinstance(weekdays, list) or not all(
+            type(d) is int and 0 <= d <= 6 for d in weekdays
+        ):
+            return None
+        weekday_mask = sum(1 << d for d in set(weekdays))
+    if not weekday_mask:
+        return None
+
+    time_from = parse_clock(data.get("time_from") or "00:00")
+    time_to = parse_clock(data.get("time_to") or "24:00")
+    if time_from is None or time_to is None or time_from >= time_to:
+        return None
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "weekday_mask": weekday_mask,
+        "time_from": time_from,
+        "time_to": time_to,
+    }
+
+
 # =========================
 # 알람 목록 조회 API
 # =========================
@@ -436,7 +1318,8 @@ def alarm_list():
     with get_db() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT court_group, date, created_at
+                SELECT id, court_group, date, date_from, date_to,
+                       weekday_mask, time_from, time_to, created_at
                 FROM alarms
                 WHERE subscription_id = %s
                 ORDER BY created_at DESC
@@ -451,20 +1334,33 @@ def alarm_list():
 @app.route("/alarm/delete", methods=["POST"])
 def alarm_delete():
     body = request.json or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "invalid request"}), 400
 
     subscription_id = body.get("subscription_id")
+    alarm_id = body.get("id")
     court_group = body.get("court_group")
     date = body.get("date")
 
-    if not subscription_id or not court_group or not date:
+    if not subscription_id or not (alarm_id or (court_group and date)):
+        return jsonify({"error": "invalid request"}), 400
+    if alarm_id is not None and type(alarm_id) is not int:
+        return jsonify({"error": "invalid id"}), 400
+    if not all(isinstance(v, str) for v in (subscription_id, court_group or "", date or "")):
         return jsonify({"error": "invalid request"}), 400
 
     with get_db() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM alarms
-                WHERE subscription_id=%s AND court_group=%s AND date=%s
-            """, (subscription_id, court_group, date))
+            if alarm_id:
+                cur.execute("""
+                    DELETE FROM alarms
+                    WHERE subscription_id=%s AND id=%s
+                """, (subscription_id, alarm_id))
+            else:
+                cur.execute("""
+                    DELETE FROM alarms
+                    WHERE subscription_id=%s AND court_group=%s AND date=%s
+                """, (subscription_id, court_group, date))
 
     return jsonify({"status": "deleted"})
 # =========================
@@ -563,43 +1459,169 @@ def add_to_baseline(cur, subscription_id, court_group, date, time_content):
     """, (subscription_id, court_group, date, time_content))
 
 
+# =========================
+# 날짜 파티션 관리
+# =========================
+def list_date_partitions(cur, table):
+    """
+    {"20251222": "baseline_slots_p20251222", ...}
+    """
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+    """, (table,))
+
+    partitions = {}
+    for (name,) in cur.fetchall():
+        m = re.fullmatch(rf"{table}_p(\d{{8}})", name)
+        if m:
+            partitions[m.group(1)] = name
+    return partitions
+
+
+def ensure_date_partitions(cur, table, dates):
+    column = PARTITIONED_TABLES[table]
+    existing = list_date_partitions(cur, table)
+
+    for date in dates:
+        if date in existing or not re.fullmatch(r"\d{8}", date):
+            continue
+
+        name = f"{table}_p{date}"
+        # default 파티션에 이미 들어간 같은 날짜 행은 새 파티션으로 옮긴 뒤 attach
+        cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE {column} = %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, (date,))
+        cur.execute(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES IN (%s)",
+            (date,)
+        )
+
+
+def drop_expired_partitions(cur, table, today):
+    column = PARTITIONED_TABLES[table]
+
+    for date, name in list_date_partitions(cur, table).items():
+        if date < today:
+            cur.execute(f"DROP TABLE {name}")
+
+    cur.execute(
+        f"DELETE FROM {table}_default WHERE {column} < %s",
+        (today,)
+    )
+
+
 # =========================
 # 기준선 슬롯 정리
 # =========================
 def cleanup_old_alarm_data(cur):
-    today = datetime.now(KST).strftime("%Y%m%d")
+    now = datetime.now(KST)
+    today = now.strftime("%Y%m%d")
 
     cur.execute("""
         DELETE FROM alarms
         WHERE date < %s
     """, (today,))
 
+    # 지난 날짜 = 파티션 DROP
+    for table in PARTITIONED_TABLES:
+        drop_expired_partitions(cur, table, today)
+
     cur.execute("""
-        DELETE FROM baseline_slots
+        DELETE FROM sent_slots
+        WHERE sent_at < NOW() - INTERVAL '1 day'
+    """)
+
+    cur.execute("""
+        DELETE FROM slot_snapshots
         WHERE date < %s
     """, (today,))
 
+    # 슬롯 이벤트는 관측 시각 기준 보관 기간만 유지 (BRIN 인덱스로 범위 삭제)
     cur.execute("""
-        DELETE FROM sent_slots
-        WHERE sent_at < NOW() - INTERVAL '1 day';
-    """, (f"%|{today}%",))
+        DELETE FROM slot_events
+        WHERE observed_at < NOW() - %s * INTERVAL '1 day'
+    """, (SLOT_EVENT_RETENTION_DAYS,))
+
+    # 다음 크롤링 범위의 파티션 미리 생성
+    upcoming = [
+        (now + timedelta(days=i)).strftime("%Y%m%d")
+        for i in range(PARTITION_AHEAD_DAYS + 1)
+    ]
+    for table in PARTITIONED_TABLES:
+        ensure_date_partitions(cur, table, upcoming)
 
 
 # =========================
-# 코트 그룹 추출
+# 백그라운드 DB 정리 작업
 # =========================
-def get_court_group(title: str) -> str:
-    if not title:
-        return ""
+MAINTENANCE_INTERVAL = timedelta(
+    seconds=int(os.environ.get("MAINTENANCE_INTERVAL_SEC", "3600"))
+)
+maintenance_started = False
+
+
+def run_maintenance():
+    try:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                # 다른 워커가 정리 중이면 이번 회차는 건너뜀
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (MAINTENANCE_LOCK_KEY,))
+                if not cur.fetchone()[0]:
+                    return
+                cleanup_old_alarm_data(cur)
+            conn.commit()
+        print("[INFO] maintenance done")
+    except Exception as e:
+        print("[ERROR] maintenance failed", e)
+
+
+def maintenance_loop():
+    while True:
+        run_maintenance()
+        time.sleep(MAINTENANCE_INTERVAL.total_seconds())
 
-    # [유료], [무료] 같은 대괄호 제거
-    title = re.sub(r"\[.*?\]", "", title)
 
-    # '테니스장' 앞까지만 사용
-    if "테니스장" in title:
-        title = title.split("테니스장")[0]
+def start_maintenance_thread():
+    # ensure_db_initialized 의 DB_INIT_LOCK 안에서만 호출
+    global maintenance_started
+    if maintenance_started:
+        return
+
+    maintenance_started = True
+    threading.Thread(
+        target=maintenance_loop,
+        name="db-maintenance",
+        daemon=True
+    ).start()
 
-    return title.strip()
+
+# =========================
+# 현재 캐시에서 규칙에 맞는 슬롯 조회
+# =========================
+def current_rule_slots(court_group, rule):
+    cache = CACHE
+    index = SlotIndex()
+    for cid in build_court_group_map(cache["facilities"]).get(court_group, []):
+        for date, slots in cache["availability"].get(cid, {}).items():
+            for s in slots:
+                index.add(court_group, date, s["timeContent"])
+
+    return index.freeze().match(
+        court_group,
+        rule["date_from"],
+        rule["date_to"],
+        rule["weekday_mask"],
+        rule["time_from"],
+        rule["time_to"],
+    )
 
 # =========================
 # 코트 그룹 맵 빌드
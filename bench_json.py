@@ -0,0 +1,107 @@
+"""
+JSON 코덱 벤치마크
+
+    python bench_json.py [--facilities 40] [--days 45] [--rounds 5]
+
+- decode: fetch_times 응답(resveTmList) 형태의 작은 JSON 을 반복 디코딩
+- encode: /data 응답 형태의 큰 JSON 을 인코딩
+코덱별(json / orjson) MB/s, ops/s 를 출력한다.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import json_codec
+
+TIMES = [f"{h:02d}:00 ~ {h + 2:02d}:00" for h in range(6, 22, 2)]
+
+
+def make_resve_tm_list(rid, date_val, rng):
+    return {
+        "resveTmList": [
+            {
+                "resveId": rid,
+                "resveDe": date_val,
+                "timeContent": t,
+                "tmSn": i + 1,
+                "resveAt": "Y",
+                "amount": 8000,
+            }
+            for i, t in enumerate(TIMES)
+            if rng.random() < 0.4
+        ],
+        "resultCode": "SUCCESS",
+    }
+
+
+def make_data_payload(facilities, days, rng):
+    start = datetime(2026, 1, 1)
+    dates = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range(days)]
+
+    fac = {}
+    availability = {}
+    for n in range(facilities):
+        rid = str(10100 + n)
+        fac[rid] = {"title": f"[유료] 코트{n} 테니스장 {n % 4 + 1}번", "location": "용인시 수지구"}
+        availability[rid] = {
+            d: [
+                {"timeContent": s["timeContent"], "resveId": rid}
+                for s in make_resve_tm_list(rid, d, rng)["resveTmList"]
+            ]
+            for d in dates
+            if rng.random() < 0.5
+        }
+
+    return {
+        "facilities": fac,
+        "availability": availability,
+        "updated_at": start.isoformat(),
+    }
+
+
+def bench(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--facilities", type=int, default=40)
+    parser.add_argument("--days", type=int, default=45)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    json_codec.use("json")
+    small = [
+        json_codec.dumps(make_resve_tm_list("10343", f"202601{d % 28 + 1:02d}", rng))
+        for d in range(args.facilities * args.days)
+    ]
+    big = make_data_payload(args.facilities, args.days, rng)
+
+    small_bytes = sum(len(b) for b in small)
+    big_bytes = len(json_codec.dumps(big))
+    print(f"decode: {len(small)} resveTmList responses, {small_bytes / 1024:.1f} KiB")
+    print(f"encode: /data payload {big_bytes / 1024:.1f} KiB")
+    print()
+
+    for name in sorted(json_codec.CODECS):
+        json_codec.use(name)
+
+        t_dec = bench(lambda: [json_codec.loads(b) for b in small], args.rounds)
+        t_enc = bench(lambda: json_codec.dumps(big), args.rounds)
+
+        print(
+            f"{name:7s} "
+            f"decode {len(small) / t_dec:10.0f} ops/s {small_bytes / t_dec / 1e6:7.1f} MB/s | "
+            f"encode {1 / t_enc:8.1f} ops/s {big_bytes / t_enc / 1e6:7.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
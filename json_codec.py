@@ -0,0 +1,64 @@
+"""
+JSON 코덱 레이어
+- orjson 이 설치돼 있으면 사용, 없으면 stdlib json 으로 대체
+- 환경변수 JSON_CODEC=json 으로 강제 지정 가능
+- dumps() 는 항상 UTF-8 bytes 를 반환
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _std_loads(data):
+    return json.loads(data)
+
+
+def _std_dumps(obj, default=None):
+    return json.dumps(
+        obj,
+        default=default,
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _orjson_loads(data):
+    return orjson.loads(data)
+
+
+def _orjson_dumps(obj, default=None):
+    # datetime 은 default 로 넘겨서 stdlib 경로와 같은 포맷 유지
+    return orjson.dumps(
+        obj,
+        default=default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    )
+
+
+CODECS = {
+    "json": (_std_loads, _std_dumps),
+}
+if orjson is not None:
+    CODECS["orjson"] = (_orjson_loads, _orjson_dumps)
+
+NAME = None
+loads = None
+dumps = None
+
+
+def use(name):
+    """
+    코덱 전환 (없는 이름이면 stdlib json)
+    """
+    global NAME, loads, dumps
+    if name not in CODECS:
+        name = "json"
+    NAME = name
+    loads, dumps = CODECS[name]
+
+
+use(os.environ.get("JSON_CODEC", "orjson"))
@@ -0,0 +1,9 @@
+"""
+HTTP API 부하 테스트
+
+    DATABASE_URL=postgresql://localhost/tennis_load python -m loadtest --help
+
+- app 을 로컬 Postgres 에 붙여 같은 프로세스에서 스레드 수 고정(--threads) 서버로 띄움
+- webpush 는 로컬 stub 엔드포인트로 발송 (암호화까지 실제 경로)
+- 크롤링(run_all / stream_all) 은 녹화한 스냅샷 또는 합성 fixture 로 대체
+"""
@@ -0,0 +1,339 @@
+"""
+python -m loadtest [옵션]
+
+1) 로컬 Postgres 초기화(마이그레이션 + 테이블 비우기) 후 구독/알람 시드
+2) 엔드포인트별로 --duration 초 동안 --concurrency 스레드로 요청 → RPS, p50/p95/p99
+3) /refresh 가 도는 동안의 /data 지연
+4) 알람 수를 --alarm-steps 만큼 늘려 가며 /refresh 소요 시간 / 발송 수 측정
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from psycopg2.extras import execute_values
+
+import json_codec
+from loadtest.fixtures import (
+    make_fixture, load_fixture, fixture_groups, fixture_dates, with_openings, replay_stream
+)
+from loadtest.push_stub import PushStub, make_subscription_keys, make_vapid_private_key
+
+ENDPOINTS = ["data", "alarm_list", "alarm_add", "push_subscribe"]
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", ""}
+TABLES = [
+    "alarms", "push_subscriptions", "sent_slots", "baseline_slots",
+    "slot_snapshots", "slot_events",
+]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m loadtest")
+    parser.add_argument("--fixture", help="녹화한 스냅샷 (python -m tennis_core --format snapshot)")
+    parser.add_argument("--facilities", type=int, default=40)
+    parser.add_argument("--days", type=int, default=45)
+    parser.add_argument("--slots-per-day", type=int, default=3)
+    parser.add_argument("--subscriptions", type=int, default=500)
+    parser.add_argument("--alarms", type=int, default=1000, help="엔드포인트 측정 전 알람 수")
+    parser.add_argument("--alarm-steps", default="1000,5000,20000",
+                        help="refresh 측정 시 알람 수 단계 (쉼표 구분)")
+    parser.add_argument("--openings", type=int, default=50, help="refresh 마다 새로 여는 슬롯 수")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=10.0, help="엔드포인트당 측정 시간(초)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="앱 서버 요청 처리 스레드 수 상한 (gunicorn --threads 와 동일하게)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="결과를 JSON 으로 저장")
+    parser.add_argument("--allow-remote-db", action="store_true",
+                        help="localhost 가 아닌 DATABASE_URL 허용 (테이블을 비우므로 주의)")
+    return parser
+
+
+# --------------------------------------------------------------
+# 통계
+# --------------------------------------------------------------
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def summarize(name, latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        "endpoint": name,
+        "requests": len(values),
+        "errors": errors,
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def print_endpoint_table(rows):
+    print(f"{'endpoint':28s} {'req':>7s} {'err':>5s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for r in rows:
+        print(
+            f"{r['endpoint']:28s} {r['requests']:7d} {r['errors']:5d} {r['rps']:8.1f} "
+            f"{r['p50_ms']:7.1f}m {r['p95_ms']:7.1f}m {r['p99_ms']:7.1f}m"
+        )
+
+
+# --------------------------------------------------------------
+# 부하 생성
+# --------------------------------------------------------------
+def hammer(name, make_request, duration, concurrency, stop=None):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        session = requests.Session()
+        local = []
+        local_errors = 0
+        while time.perf_counter() < deadline and not (stop and stop.is_set()):
+            t0 = time.perf_counter()
+            try:
+                res = make_request(session)
+                ok = res.status_code < 400
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - t0)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(name, latencies, errors[0], time.perf_counter() - started)
+
+
+class Scenario:
+    def __init__(self, base_url, stub, sub_ids, groups, dates, seed):
+        self.base_url = base_url
+        self.stub = stub
+        self.sub_ids = sub_ids
+        self.groups = groups
+        self.dates = dates
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.keys = [make_subscription_keys() for _ in range(64)]
+
+    def pick(self, seq):
+        with self.rng_lock:
+            return self.rng.choice(seq)
+
+    def data(self, session):
+        return session.get(f"{self.base_url}/data")
+
+    def alarm_list(self, session):
+        return session.get(f"{self.base_url}/alarm/list",
+                           params={"subscription_id": self.pick(self.sub_ids)})
+
+    def alarm_add(self, session):
+        date = self.pick(self.dates)
+        return session.post(f"{self.base_url}/alarm/add", json={
+            "subscription_id": self.pick(self.sub_ids),
+            "court_group": self.pick(self.groups),
+            "date": f"{date[:4]}-{date[4:6]}-{date[6:]}",
+            "time_from": self.pick(["06:00", "12:00", "18:00", "19:00"]),
+        })
+
+    def push_subscribe(self, session):
+        p256dh, auth = self.pick(self.keys)
+        with self.rng_lock:
+            name = f"load-{self.rng.getrandbits(48):x}"
+        return session.post(f"{self.base_url}/push/subscribe", json={
+            "endpoint": self.stub.endpoint(name),
+            "keys": {"p256dh": p256dh, "auth": auth},
+        })
+
+
+# --------------------------------------------------------------
+# DB 시드
+# --------------------------------------------------------------
+def reset_tables(app):
+    with app.get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {', '.join(TABLES)}")
+            # db_initialized=True 로 정리 스레드를 건너뛰므로 날짜 파티션은 여기서 생성
+            # (안 하면 전부 DEFAULT 파티션으로 들어가 운영과 다른 계획으로 측정됨)
+            app.cleanup_old_alarm_data(cur)
+        conn.commit()
+    app.set_slot_snapshot(None, None)
+
+
+def seed_subscriptions(app, stub, count):
+    rows = []
+    for n in range(count):
+        endpoint = stub.endpoint(f"seed-{n}")
+        p256dh, auth = make_subscription_keys()
+        rows.append((app.make_subscription_id({"endpoint": endpoint}), endpoint, p256dh, auth))
+
+    with app.get_db() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO push_subscriptions (id, endpoint, p256dh, auth)
+                VALUES %s
+                ON CONFLICT (id) DO NOTHING
+            """, rows)
+        conn.commit()
+    return [r[0] for r in rows]
+
+
+def alarm_count(app):
+    with app.get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM alarms")
+            return cur.fetchone()[0]
+
+
+def seed_alarms(app, sub_ids, groups, dates, target, rng):
+    """
+    단일 날짜 / 날짜 범위+요일 / 시간대 규칙을 섞어서 target 개까지
+    """
+    need = target - alarm_count(app)
+    if need <= 0:
+        return
+
+    rows = []
+    for _ in range(need):
+        i = rng.randrange(len(dates))
+        j = min(len(dates) - 1, i + rng.choice([0, 0, 0, 6, 13]))
+        rows.append((
+            rng.choice(sub_ids), rng.choice(groups), dates[j],
+            dates[i], dates[j],
+            rng.choice([127, 127, 0b0011111, 0b1100000]),
+            rng.choice([0, 0, 360, 1080, 1140]),
+            1440,
+        ))
+
+    with app.get_db() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO alarms
+                    (subscription_id, court_group, date,
+                     date_from, date_to, weekday_mask, time_from, time_to)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, rows)
+        conn.commit()
+
+
+# --------------------------------------------------------------
+# 실행
+# --------------------------------------------------------------
+def timed_refresh(base_url, stub):
+    before = stub.received
+    t0 = time.perf_counter()
+    res = requests.get(f"{base_url}/refresh", params={"wait": "1"})
+    elapsed = time.perf_counter() - t0
+    return res.status_code, elapsed, stub.received - before
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if not os.environ.get("DATABASE_URL"):
+        sys.exit("DATABASE_URL 이 필요합니다 (로컬 Postgres)")
+    host = urlparse(os.environ["DATABASE_URL"]).hostname or ""
+    if host not in LOCAL_HOSTS and not args.allow_remote_db:
+        sys.exit(f"DATABASE_URL 호스트가 로컬이 아닙니다: {host} (--allow-remote-db)")
+
+    os.environ.setdefault("DATABASE_SSLMODE", "disable")
+    os.environ.setdefault("VAPID_PRIVATE_KEY", make_vapid_private_key())
+
+    import app as tennis_app
+    from loadtest.server import PooledWSGIServer
+
+    rng = random.Random(args.seed)
+    fixture = load_fixture(args.fixture) if args.fixture else make_fixture(
+        args.facilities, args.days, args.slots_per_day, seed=args.seed
+    )
+    groups = fixture_groups(fixture)
+    dates = fixture_dates(fixture)
+
+    stub = PushStub().start()
+    tennis_app.init_db()
+    tennis_app.db_initialized = True
+    reset_tables(tennis_app)
+    tennis_app.stream_all = replay_stream(fixture)
+
+    # 배포(gunicorn gthread --threads N)와 같은 동시 처리 상한
+    server = PooledWSGIServer("127.0.0.1", 0, tennis_app.app, args.threads)
+    threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"[INFO] app {base_url} | push stub {stub.url}")
+    print(f"[INFO] fixture: {len(fixture['facilities'])} facilities, {len(groups)} groups, {len(dates)} dates")
+
+    sub_ids = seed_subscriptions(tennis_app, stub, args.subscriptions)
+    seed_alarms(tennis_app, sub_ids, groups, dates, args.alarms, rng)
+
+    # 캐시 / 스냅샷 채우기 (최초 refresh 는 알람 ❌)
+    code, elapsed, _ = timed_refresh(base_url, stub)
+    print(f"[INFO] warm-up refresh {code} {elapsed:.2f}s")
+
+    results = {"endpoints": [], "data_during_refresh": None, "refresh": []}
+    scenario = Scenario(base_url, stub, sub_ids, groups, dates, args.seed)
+
+    # ① 엔드포인트별
+    for name in [e.strip() for e in args.endpoints.split(",") if e.strip()]:
+        results["endpoints"].append(
+            hammer(name, getattr(scenario, name), args.duration, args.concurrency)
+        )
+    print()
+    print_endpoint_table(results["endpoints"])
+
+    # ② refresh 도중 /data
+    tennis_app.stream_all = replay_stream(with_openings(fixture, args.openings, rng))
+    stop = threading.Event()
+    refresh_thread = threading.Thread(
+        target=lambda: (timed_refresh(base_url, stub), stop.set()),
+        daemon=True
+    )
+    refresh_thread.start()
+    during = hammer("data (during /refresh)", scenario.data, args.duration, args.concurrency, stop)
+    refresh_thread.join()
+    results["data_during_refresh"] = during
+    print_endpoint_table([during])
+
+    # ③ 알람 수에 따른 refresh 소요 시간
+    print()
+    print(f"{'alarms':>8s} {'status':>6s} {'refresh':>9s} {'pushes':>7s}")
+    for step in [int(x) for x in args.alarm_steps.split(",") if x.strip()]:
+        seed_alarms(tennis_app, sub_ids, groups, dates, step, rng)
+        tennis_app.stream_all = replay_stream(with_openings(fixture, args.openings, rng))
+        code, elapsed, pushes = timed_refresh(base_url, stub)
+        count = alarm_count(tennis_app)
+        results["refresh"].append({
+            "alarms": count, "status": code, "seconds": elapsed, "pushes": pushes,
+        })
+        print(f"{count:8d} {code:6d} {elapsed:8.2f}s {pushes:7d}")
+
+    server.shutdown()
+    server.server_close()
+    stub.stop()
+
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(json_codec.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
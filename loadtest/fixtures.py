@@ -0,0 +1,106 @@
+"""
+크롤링 fixture
+- 녹화: python -m tennis_core --format snapshot -o fixture.json
+- 합성: make_fixture(...)
+replay_stream() 은 tennis_core.stream_all 과 같은 시그니처로 fixture 를 흘려 보낸다.
+"""
+import random
+from datetime import datetime, timedelta
+
+import json_codec
+
+GROUP_NAMES = ["죽전", "남사", "수지", "기흥", "처인", "동백", "보정", "신갈", "상현", "구성"]
+TIMES = [f"{h:02d}:00 ~ {h + 2:02d}:00" for h in range(6, 22, 2)]
+
+
+def group_name(n):
+    base = GROUP_NAMES[n % len(GROUP_NAMES)]
+    return base if n < len(GROUP_NAMES) else f"{base}{n // len(GROUP_NAMES)}"
+
+
+def make_fixture(facilities=40, days=45, slots_per_day=3, courts_per_group=3, seed=0):
+    rng = random.Random(seed)
+    start = datetime.today() + timedelta(days=1)
+    dates = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range(days)]
+
+    fac = {}
+    availability = {}
+    for n in range(facilities):
+        rid = str(10100 + n)
+        group = group_name(n // courts_per_group)
+        fac[rid] = {
+            "title": f"[유료] {group}테니스장 {n % courts_per_group + 1}번",
+            "location": "용인시",
+        }
+        availability[rid] = {
+            d: [
+                {"timeContent": t, "resveId": rid}
+                for t in sorted(rng.sample(TIMES, min(slots_per_day, len(TIMES))))
+            ]
+            for d in dates
+            if slots_per_day
+        }
+
+    return {"facilities": fac, "availability": availability}
+
+
+def load_fixture(path):
+    with open(path, "rb") as f:
+        data = json_codec.loads(f.read())
+    return {"facilities": data["facilities"], "availability": data["availability"]}
+
+
+def fixture_groups(fixture):
+    from tennis_core import get_court_group
+    return sorted({
+        get_court_group(f.get("title", ""))
+        for f in fixture["facilities"].values()
+    } - {""})
+
+
+def fixture_dates(fixture):
+    return sorted({d for days in fixture["availability"].values() for d in days})
+
+
+def with_openings(fixture, count, rng):
+    """
+    비어 있던 시간 count 개를 새로 연 availability (원본은 그대로)
+    """
+    availability = {
+        rid: {d: list(slots) for d, slots in days.items()}
+        for rid, days in fixture["availability"].items()
+    }
+    rids = list(fixture["facilities"])
+    dates = fixture_dates(fixture)
+
+    opened = 0
+    attempts = 0
+    while opened < count and attempts < count * 20 and rids and dates:
+        attempts += 1
+        rid = rng.choice(rids)
+        date = rng.choice(dates)
+        slots = availability.setdefault(rid, {}).setdefault(date, [])
+        free = [t for t in TIMES if t not in {s["timeContent"] for s in slots}]
+        if not free:
+            continue
+        slots.append({"timeContent": rng.choice(free), "resveId": rid})
+        opened += 1
+
+    return {"facilities": fixture["facilities"], "availability": availability}
+
+
+def replay_stream(fixture):
+    """
+    app.stream_all 대체
+    """
+    def stream_all(on_result, on_facilities=None, **kwargs):
+        facilities = dict(fixture["facilities"])
+        if on_facilities:
+            on_facilities(facilities)
+        for rid, days in fixture["availability"].items():
+            for date, slots in days.items():
+                if slots:
+                    on_result(rid, date, [dict(s) for s in slots])
+        return facilities
+
+    return stream_all
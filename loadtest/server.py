@@ -0,0 +1,30 @@
+"""
+스레드 수가 고정된 WSGI 서버 (gunicorn gthread --threads N 과 같은 상한)
+werkzeug threaded=True 는 연결마다 스레드를 새로 만들어서 배포 환경보다 처리량이 부풀려진다.
+연결은 요청 하나 처리 후 닫힘 (HTTP/1.0) → 유휴 keep-alive 연결이 스레드를 잡지 않음
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="app-worker")
+
+    def process_request(self, request, client_address):
+        # accept 는 serve_forever 스레드, 처리는 풀에서 (풀이 다 차면 큐에서 대기)
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,215 @@
+"""
+요청 단위 프로파일러 (stdlib 만 사용)
+- CPU: 별도 스레드가 대상 스레드의 스택을 주기적으로 샘플링
+  (spawned=True 면 시작 후 새로 생긴 스레드도 같이, 스택 맨 앞에 스레드 이름)
+- 메모리: tracemalloc 상위 할당 위치 + peak
+리포트는 PROFILE_DIR 에 .txt (요약) / .folded (flamegraph 입력) 로 저장
+"""
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "20"))
+TRACEMALLOC_FRAMES = 10
+TOP_N = 30
+
+# tracemalloc 은 프로세스 전역이라 메모리 측정은 한 번에 하나의 Profiler 만
+# (동시에 시작된 나머지는 CPU 샘플링만 함)
+_memory_lock = threading.Lock()
+_memory_owner = None
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """
+    with Profiler("refresh") as p: ...
+    p.save() → 리포트 파일 이름
+    spawned=True: 대상 스레드가 띄운 작업 스레드(알람 처리 등)도 샘플링
+    """
+
+    def __init__(self, name, thread_id=None, memory=True, spawned=False):
+        self.name = name
+        self.thread_id = thread_id or threading.get_ident()
+        self.memory = memory
+        self.spawned = spawned
+        self._existing = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._own_tracemalloc = False
+        self.memory_skipped = False
+        self.started = None
+        self.elapsed = 0.0
+        self.snapshot = None
+        self.peak = 0
+
+    # ----------------------------------------------------------
+    def start(self):
+        global _memory_owner
+        if self.memory:
+            with _memory_lock:
+                if _memory_owner is None:
+                    _memory_owner = self
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start(TRACEMALLOC_FRAMES)
+                        self._own_tracemalloc = True
+                    tracemalloc.reset_peak()
+                else:
+                    self.memory = False
+                    self.memory_skipped = True
+
+        # 시작 시점에 이미 있던 스레드(다른 요청 처리 등)는 제외
+        self._existing = set(sys._current_frames()) - {self.thread_id}
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample_loop,
+            name=f"profiler-{self.name}",
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+        if self.memory:
+            global _memory_owner
+            with _memory_lock:
+                try:
+                    self.snapshot = tracemalloc.take_snapshot()
+                    self.peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    if self._own_tracemalloc:
+                        tracemalloc.stop()
+                    _memory_owner = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(PROFILE_INTERVAL):
+            frames = sys._current_frames()
+            if not self.spawned:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self._record(frame)
+                continue
+
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me or ident in self._existing:
+                    continue
+                self._record(frame, f"thread:{names.get(ident, ident)}")
+
+    def _record(self, frame, root=None):
+        stack = []
+        while frame is not None:
+            stack.append(frame_label(frame))
+            frame = frame.f_back
+        if root:
+            stack.append(root)
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    # ----------------------------------------------------------
+    def cpu_summary(self):
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += n
+            for f in set(frames):
+                total_counts[f] += n
+        return self_counts, total_counts
+
+    def render(self):
+        lines = [
+            f"profile: {self.name}",
+            f"duration: {self.elapsed:.3f}s",
+            f"samples: {self.samples} (interval {PROFILE_INTERVAL * 1000:.1f}ms)",
+        ]
+
+        self_counts, total_counts = self.cpu_summary()
+        total = max(self.samples, 1)
+
+        lines += ["", f"== CPU: top {TOP_N} by self samples =="]
+        for label, n in self_counts.most_common(TOP_N):
+            lines.append(f"{n / total * 100:6.1f}%  {n:6d}  {label}")
+
+        lines += ["", f"== CPU: top {TOP_N} by total samples =="]
+        for label, n in total_counts.most_common(TOP_N):
+            lines.append(f"{n / total * 100:6.1f}%  {n:6d}  {label}")
+
+        if self.memory_skipped:
+            lines += ["", "== memory: skipped (another profile was measuring memory) =="]
+        if self.snapshot is not None:
+            lines += [
+                "",
+                f"== memory: peak {self.peak / 1024 / 1024:.1f} MiB, top {TOP_N} allocations =="
+            ]
+            snapshot = self.snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for stat in snapshot.statistics("lineno")[:TOP_N]:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"{stat.size / 1024:10.1f} KiB  {stat.count:8d}  "
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def render_folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        base = f"{stamp}-{re.sub(r'[^A-Za-z0-9_-]', '_', self.name)}"
+
+        with open(os.path.join(PROFILE_DIR, base + ".txt"), "w", encoding="utf-8") as f:
+            f.write(self.render())
+        with open(os.path.join(PROFILE_DIR, base + ".folded"), "w", encoding="utf-8") as f:
+            f.write(self.render_folded())
+
+        prune_reports()
+        return base
+
+
+def list_reports():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(
+        (n for n in os.listdir(PROFILE_DIR) if n.endswith((".txt", ".folded"))),
+        reverse=True
+    )
+
+
+def prune_reports():
+    reports = sorted({n.rsplit(".", 1)[0] for n in list_reports()}, reverse=True)
+    for base in reports[PROFILE_KEEP:]:
+        for ext in (".txt", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, base + ext))
+            except OSError:
+                pass
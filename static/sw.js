@@ -1,3 +1,108 @@
+// 앱 셸 버전: 등록 URL 의 ?v= (서버가 콘텐츠 해시로 채움)
+const VERSION = new URL(self.location).searchParams.get("v") || "dev";
+const SHELL_CACHE = `shell-${VERSION}`;
+const DATA_CACHE = "data";
+
+// --------------------------------------------------------------
+// 설치: /shell.json 목록대로 앱 셸 precache
+// --------------------------------------------------------------
+self.addEventListener("install", event => {
+  event.waitUntil((async () => {
+    const res = await fetch("/shell.json", { cache: "no-store" });
+    const shell = await res.json();
+    const cache = await caches.open(SHELL_CACHE);
+    await cache.addAll(shell.urls);
+    await self.skipWaiting();
+  })());
+});
+
+// 이전 버전 셸 캐시 정리
+self.addEventListener("activate", event => {
+  event.waitUntil((async () => {
+    const keys = await caches.keys();
+    await Promise.all(
+      keys
+        .filter(k => k.startsWith("shell-") && k !== SHELL_CACHE)
+        .map(k => caches.delete(k))
+    );
+    await self.clients.claim();
+  })());
+});
+
+// --------------------------------------------------------------
+// fetch: 셸은 캐시 우선, /data 는 stale-while-revalidate
+// --------------------------------------------------------------
+self.addEventListener("fetch", event => {
+  const req = event.request;
+  if (req.method !== "GET") return;
+
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname === "/data") {
+    event.respondWith(staleWhileRevalidateData(event));
+    return;
+  }
+
+  if (req.mode === "navigate" && url.pathname === "/") {
+    event.respondWith(cacheFirst(event, "/"));
+    return;
+  }
+
+  if (url.pathname.startsWith("/static/")) {
+    event.respondWith(cacheFirst(event, req));
+  }
+});
+
+async function cacheFirst(event, key) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cached = await cache.match(key);
+
+  const network = fetch(event.request).then(res => {
+    if (res.ok) cache.put(key, res.clone());
+    return res;
+  });
+
+  if (cached) {
+    // 백그라운드 갱신
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+  }
+  return network;
+}
+
+async function staleWhileRevalidateData(event) {
+  const cache = await caches.open(DATA_CACHE);
+  const cached = await cache.match("/data");
+  const prevVersion = cached ? cached.headers.get("X-Data-Version") : null;
+
+  const network = fetch(event.request).then(async res => {
+    if (!res.ok) return res;
+
+    await cache.put("/data", res.clone());
+
+    const version = res.headers.get("X-Data-Version");
+    if (servedFromCache && version !== prevVersion) {
+      // 새 버전 → 열려 있는 화면에 다시 그리라고 알림
+      const clients = await self.clients.matchAll({ type: "window" });
+      clients.forEach(c => c.postMessage({ type: "data-updated", version }));
+    }
+    return res;
+  });
+
+  // 당겨서 새로고침(cache: "reload") 은 네트워크 우선
+  const servedFromCache = Boolean(cached) && event.request.cache !== "reload";
+  if (!servedFromCache) {
+    return network.catch(() => cached || Response.error());
+  }
+
+  event.waitUntil(network.catch(() => {}));
+  return cached;
+}
+
+// --------------------------------------------------------------
+// push
+// --------------------------------------------------------------
 self.addEventListener("push", event => {
   const data = event.data.json();
 
@@ -1,8 +1,22 @@
 import aiohttp
 import asyncio
 import re
+import os
+import json
+import zlib
+import hashlib
+import sys
+import time
+import argparse
+import contextlib
+import bisect
+import tempfile
+from collections import defaultdict
+from functools import lru_cache
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+
+import json_codec
+from datetime import datetime, timedelta, timezone
 import calendar
 
 # 테니스 시설 목록 endpoint
@@ -75,6 +89,23 @@ def parse_facility_html(html):
     return results
 
 
+# --------------------------------------------------------------
+# 코트 그룹 추출 ("[유료] 죽전테니스장 1번" → "죽전")
+# --------------------------------------------------------------
+def get_court_group(title: str) -> str:
+    if not title:
+        return ""
+
+    # [유료], [무료] 같은 대괄호 제거
+    title = re.sub(r"\[.*?\]", "", title)
+
+    # '테니스장' 앞까지만 사용
+    if "테니스장" in title:
+        title = title.split("테니스장")[0]
+
+    return title.strip()
+
+
 # --------------------------------------------------------------
 # ① 테니스 시설 전체 페이지 크롤링
 # --------------------------------------------------------------
@@ -128,60 +159,450 @@ async def fetch_times(session, date_val, rid):
 
     try:
         async with session.post(url, data=data) as resp:
-            j = await resp.json()
+            j = json_codec.loads(await resp.read())
             return j.get("resveTmList", [])
     except:
         return []
 
 
+# --------------------------------------------------------------
+# 시설별 예약 오픈 범위 학습
+# --------------------------------------------------------------
+# 시설마다 "며칠 앞까지 열리는지", "항상 비어있는 요일" 을 기억해
+# 빈 응답만 돌아오는 날짜 요청을 건너뛴다.
+# 요일 통계는 전체 요청(full scan) 회차 단위로만 센다.
+# → 예약이 꽉 찬 요일(빈 응답)은 취소 자리가 한 번이라도 보이면 바로 초기화되고,
+#   휴무 요일처럼 오랫동안 한 번도 슬롯이 없었던 요일만 건너뜀
+HORIZON_PROFILE_PATH = os.environ.get("HORIZON_PROFILE_PATH", "horizon_profile.json")
+HORIZON_MIN_RUNS = 5        # 이만큼 관찰하기 전에는 전 날짜 요청
+HORIZON_MARGIN_DAYS = 2     # 학습된 범위 + 여유 일수까지 요청
+WEEKDAY_EMPTY_SCANS = int(os.environ.get("WEEKDAY_EMPTY_SCANS", "100"))  # 전체 요청 N회 연속 슬롯 0 이면 건너뜀
+PROBE_EVERY = 10            # N회마다 한 번은 전 날짜 요청 (규칙 변경 감지)
+
+KST = timezone(timedelta(hours=9))
+
+FACILITY_PROFILES = {}
+
+
+def new_profile():
+    return {
+        "runs": 0,
+        "horizon": 0,
+        "weekday_empty_scans": [0] * 7,
+    }
+
+
+def is_valid_profile(profile):
+    def count(v):
+        return type(v) is int and v >= 0
+
+    if not isinstance(profile, dict):
+        return False
+    scans = profile.get("weekday_empty_scans")
+    return (
+        count(profile.get("runs"))
+        and count(profile.get("horizon"))
+        and isinstance(scans, list)
+        and len(scans) == 7
+        and all(count(v) for v in scans)
+    )
+
+
+def get_profile(rid):
+    profile = FACILITY_PROFILES.get(rid)
+    if not is_valid_profile(profile):
+        # 깨졌거나 예전 형식(날짜 단위 weekday_empty) 이면 버리고 다시 학습
+        profile = FACILITY_PROFILES[rid] = new_profile()
+    return profile
+
+
+def load_profiles(path=HORIZON_PROFILE_PATH):
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("not an object")
+        invalid = [rid for rid, p in data.items() if not is_valid_profile(p)]
+        if invalid:
+            print(f"[WARN] profile ignored (invalid): {len(invalid)} facilities")
+        FACILITY_PROFILES.update(
+            (rid, p) for rid, p in data.items() if is_valid_profile(p)
+        )
+    except Exception as e:
+        print(f"[WARN] profile load failed: {path} | {e}")
+
+
+def save_profiles(path=HORIZON_PROFILE_PATH):
+    # 웹 프로세스와 CLI 가 같은 파일을 쓸 수 있으므로 임시 파일에 쓴 뒤 교체
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(
+            prefix=os.path.basename(path) + ".",
+            suffix=".tmp",
+            dir=os.path.dirname(os.path.abspath(path))
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(FACILITY_PROFILES, f)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"[WARN] profile save failed: {path} | {e}")
+        if tmp:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+
+
+def is_critical_window_kst(now_kst: datetime) -> bool:
+    """
+    매일 23:50 ~ 24:00(KST) 구간
+    """
+    return (
+        now_kst.hour == 23 and now_kst.minute >= 50
+    ) or (
+        now_kst.hour == 0 and now_kst.minute == 0
+    )
+
+
+def is_probe_run(rid, profile):
+    # 시설마다 probe 회차를 엇갈리게 해서 한 번에 몰리지 않게
+    return (profile["runs"] + zlib.crc32(rid.encode())) % PROBE_EVERY == 0
+
+
+def plan_dates(rid, days, today, force_full=False):
+    """
+    days: 후보 날짜(date) 리스트 → (요청할 날짜 리스트, 전체 요청 여부)
+    force_full: 자정 오픈 직전/직후처럼 규칙이 바뀌는 구간에서는 학습 무시
+    """
+    profile = get_profile(rid)
+
+    if force_full or profile["runs"] < HORIZON_MIN_RUNS or is_probe_run(rid, profile):
+        return list(days), True
+
+    limit = profile["horizon"] + HORIZON_MARGIN_DAYS
+    planned = [
+        d for d in days
+        if (d - today).days <= limit
+        and profile["weekday_empty_scans"][d.weekday()] < WEEKDAY_EMPTY_SCANS
+    ]
+    return planned, False
+
+
+def learn_profile(rid, planned, result, today, full_scan):
+    profile = get_profile(rid)
+    profile["runs"] += 1
+
+    open_offsets = [
+        (d - today).days for d in planned
+        if result.get(d.strftime("%Y%m%d"))
+    ]
+    if full_scan:
+        # 전체 요청 결과로 범위를 다시 잡음 (줄어든 규칙도 반영)
+        profile["horizon"] = max(open_offsets, default=0)
+    elif open_offsets:
+        profile["horizon"] = max(profile["horizon"], max(open_offsets))
+
+    # 슬롯이 하나라도 보인 요일은 바로 초기화
+    seen = set()
+    for d in planned:
+        if result.get(d.strftime("%Y%m%d")):
+            seen.add(d.weekday())
+    for wd in seen:
+        profile["weekday_empty_scans"][wd] = 0
+
+    if not full_scan:
+        return
+
+    # 전체 요청에서 오픈 범위 안에 있었는데 슬롯이 0 이었던 요일만 +1 (회차당 1)
+    scanned = {
+        d.weekday() for d in planned
+        if (d - today).days <= profile["horizon"]
+    }
+    for wd in scanned - seen:
+        profile["weekday_empty_scans"][wd] += 1
+
+
 # --------------------------------------------------------------
 # ③ 내일 ~ 다음달 끝까지
 # --------------------------------------------------------------
-async def fetch_availability(session, rid):
-    today = datetime.today()
+def candidate_days(today):
     start = today + timedelta(days=1)  # ★ 오늘 제외
 
-    result = {}
+    next_dt = start.replace(day=1) + timedelta(days=32)
+    last_next = calendar.monthrange(next_dt.year, next_dt.month)[1]
+    end = next_dt.replace(day=last_next)
 
-    y, m = start.year, start.month
-    last_this = calendar.monthrange(y, m)[1]
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
 
-    next_dt = start.replace(day=1) + timedelta(days=32)
-    ny, nm = next_dt.year, next_dt.month
-    last_next = calendar.monthrange(ny, nm)[1]
 
-    tasks = []
+# --------------------------------------------------------------
+# 시간 슬롯 모델
+# --------------------------------------------------------------
+# "04:00 ~ 06:00" → (240, 360) 분 단위 정수 구간
+# 요일 마스크: bit0 = 월 ... bit6 = 일 (datetime.weekday() 기준)
+TIME_RANGE_RE = re.compile(r"(\d{1,2}):(\d{2})\s*~\s*(\d{1,2}):(\d{2})")
+ALL_WEEKDAYS = 0b1111111
+DAY_MINUTES = 24 * 60
+
+
+@lru_cache(maxsize=1024)
+def parse_time_content(text):
+    m = TIME_RANGE_RE.search(text or "")
+    if not m:
+        return None
+
+    h1, m1, h2, m2 = map(int, m.groups())
+    start, end = h1 * 60 + m1, h2 * 60 + m2
+    if end <= start:
+        end += DAY_MINUTES  # 자정 넘김
+    return start, end
+
+
+def parse_clock(text):
+    """
+    "19:00" → 1140, "24:00" → 1440
+    """
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})", (text or "").strip())
+    if not m:
+        return None
+    minutes = int(m.group(1)) * 60 + int(m.group(2))
+    return minutes if 0 <= minutes <= DAY_MINUTES else None
+
+
+@lru_cache(maxsize=512)
+def weekday_bit(date_val):
+    return 1 << datetime.strptime(date_val, "%Y%m%d").weekday()
+
+
+class SlotIndex:
+    """
+    (group, date) 별로 시작 시각 순 정렬한 슬롯 구간 인덱스
+    - 날짜 범위: 그룹별 정렬된 날짜 리스트에서 bisect
+    - 요일: weekday_bit 마스크 AND
+    - 시간대: 시작 시각 bisect 후 window 안에 끝나는 슬롯만
+      (자정을 넘기는 슬롯은 시작한 날 기준, 24:00 에 끝나는 것으로 봄)
+    - 시간대를 안 정한 규칙(00:00 ~ 24:00)은 시간 형식과 상관없이 모든 슬롯
+    규칙 하나를 날짜별 알람으로 펼치지 않고 한 번에 평가한다.
+    """
+
+    def __init__(self):
+        self.slots = defaultdict(list)
+        self.unparsed = defaultdict(list)  # 시간 형식을 못 읽은 슬롯 (시간대 규칙에는 안 걸림)
+        self.dates = defaultdict(set)
+        self.starts = {}
+        self.sorted_dates = {}
+
+    def __len__(self):
+        return sum(len(ds) for ds in self.dates.values())
+
+    def add(self, group, date_val, time_content):
+        rng = parse_time_content(time_content)
+        if rng is None:
+            self.unparsed[(group, date_val)].append(time_content)
+        else:
+            end = min(rng[1], DAY_MINUTES)
+            self.slots[(group, date_val)].append((rng[0], end, time_content))
+        self.dates[group].add(date_val)
+
+    def freeze(self):
+        for key, items in self.slots.items():
+            items.sort()
+            self.starts[key] = [start for start, _, _ in items]
+        self.sorted_dates = {g: sorted(ds) for g, ds in self.dates.items()}
+        return self
+
+    def groups(self):
+        return sorted(self.dates)
+
+    def date_bounds(self):
+        all_dates = [d for ds in self.sorted_dates.values() for d in (ds[0], ds[-1])]
+        return min(all_dates), max(all_dates)
+
+    def match(self, group, date_from, date_to,
+              weekday_mask=ALL_WEEKDAYS, time_from=0, time_to=DAY_MINUTES):
+        """
+        → (date, timeContent) 순서대로
+        """
+        dates = self.sorted_dates.get(group, [])
+        i = bisect.bisect_left(dates, date_from)
+        whole_day = time_from <= 0 and time_to >= DAY_MINUTES
+
+        while i < len(dates) and dates[i] <= date_to:
+            date_val = dates[i]
+            i += 1
+            if not weekday_mask & weekday_bit(date_val):
+                continue
+
+            items = self.slots.get((group, date_val), [])
+            if whole_day:
+                for _, _, text in items:
+                    yield date_val, text
+                for text in self.unparsed.get((group, date_val), []):
+                    yield date_val, text
+                continue
+
+            j = bisect.bisect_left(self.starts.get((group, date_val), []), time_from)
+            while j < len(items) and items[j][0] < time_to:
+                start, end, text = items[j]
+                j += 1
+                if end <= time_to:
+                    yield date_val, text
+
+
+# --------------------------------------------------------------
+# 스냅샷 / 변경 이벤트
+# --------------------------------------------------------------
+def slot_times(slots):
+    return sorted({s.get("timeContent") for s in slots if s.get("timeContent")})
+
+
+def content_hash(times):
+    return hashlib.blake2b("\n".join(times).encode("utf-8"), digest_size=8).hexdigest()
 
-    # 이번달
-    for d in range(start.day, last_this + 1):
-        tasks.append(fetch_times(session, f"{y}{m:02d}{d:02d}", rid))
 
-    # 다음달
-    for d in range(1, last_next + 1):
-        tasks.append(fetch_times(session, f"{ny}{nm:02d}{d:02d}", rid))
+def diff_snapshots(prev, new):
+    """
+    해시가 다른 (cid, date) 만 비교해서
+    [("A"|"R", cid, date, timeContent), ...], 바뀐 키 집합 반환
+    """
+    events = []
+    changed = set()
 
-    times_list = await asyncio.gather(*tasks)
+    for key in prev.keys() | new.keys():
+        old_hash, old_times = prev.get(key, (None, []))
+        new_hash, new_times = new.get(key, (None, []))
+        if old_hash == new_hash:
+            continue
+
+        changed.add(key)
+        cid, date = key
+        old_set, new_set = set(old_times), set(new_times)
+        for t in sorted(new_set - old_set):
+            events.append(("A", cid, date, t))
+        for t in sorted(old_set - new_set):
+            events.append(("R", cid, date, t))
 
-    idx = 0
-    for d in range(start.day, last_this + 1):
-        key = f"{y}{m:02d}{d:02d}"
-        if times_list[idx]:
-            result[key] = times_list[idx]
-        idx += 1
+    return events, changed
 
-    for d in range(1, last_next + 1):
-        key = f"{ny}{nm:02d}{d:02d}"
-        if times_list[idx]:
-            result[key] = times_list[idx]
-        idx += 1
 
-    return result
+# --------------------------------------------------------------
+# ④ 스트리밍 크롤링
+# --------------------------------------------------------------
+# (시설, 날짜) 요청을 고정 개수 worker 가 차례로 가져가고,
+# 결과는 크기 제한 큐를 거쳐 완료되는 순서대로 on_result 로 넘긴다.
+# → 동시에 메모리에 있는 응답 수가 시설 수와 무관하게 일정
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", "60"))
+RESULT_QUEUE_SIZE = int(os.environ.get("RESULT_QUEUE_SIZE", "256"))
+
+
+async def stream_availability(session, facilities, on_result,
+                              concurrency=CRAWL_CONCURRENCY,
+                              queue_size=RESULT_QUEUE_SIZE,
+                              stats=None,
+                              date_from=None,
+                              date_to=None,
+                              use_profile=True,
+                              learn=True):
+    """
+    on_result(rid, "YYYYMMDD", slots) — 빈 날짜는 호출하지 않음
+    on_result 가 awaitable 을 돌려주면 기다렸다가 다음 결과로 (다음 단계가 밀릴 때 backpressure)
+    date_from / date_to ("YYYYMMDD") 로 범위를 좁히거나 learn=False 면 부분 결과라서 학습은 안 함
+    """
+    today = datetime.today().date()
+    days = [
+        d for d in candidate_days(today)
+        if (not date_from or d.strftime("%Y%m%d") >= date_from)
+        and (not date_to or d.strftime("%Y%m%d") <= date_to)
+    ]
+    learn = learn and use_profile and not date_from and not date_to
+    force_full = is_critical_window_kst(datetime.now(KST))
+    plans = {}
+
+    def jobs():
+        for rid in facilities:
+            if use_profile:
+                planned, full_scan = plan_dates(rid, days, today, force_full)
+            else:
+                planned, full_scan = list(days), True
+            if stats is not None:
+                stats["candidates"] += len(days)
+                stats["requested"] += len(planned)
+            if not planned:
+                if learn:
+                    learn_profile(rid, planned, {}, today, full_scan)
+                continue
+
+            plans[rid] = {
+                "planned": planned,
+                "full_scan": full_scan,
+                "pending": len(planned),
+                "open": {},
+            }
+            for d in planned:
+                yield rid, d
+
+    job_iter = jobs()
+    results = asyncio.Queue(maxsize=queue_size)
+
+    async def worker():
+        for rid, d in job_iter:
+            date_val = d.strftime("%Y%m%d")
+            slots = await fetch_times(session, date_val, rid)
+            await results.put((rid, date_val, slots))
+
+    async def close():
+        # worker / jobs() 에서 예외가 나도 종료 신호는 반드시 보내고,
+        # 예외는 소비 쪽(await closer)에서 다시 올림
+        try:
+            outcomes = await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            await results.put(None)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    closer = asyncio.create_task(close())
+
+    try:
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+
+            rid, date_val, slots = item
+            plan = plans[rid]
+            plan["pending"] -= 1
+            if slots:
+                plan["open"][date_val] = True
+                pending = on_result(rid, date_val, slots)
+                if pending is not None:
+                    await pending
+
+            # 시설 하나가 끝나면 바로 오픈 범위 학습
+            if plan["pending"] == 0:
+                if learn:
+                    learn_profile(rid, plan["planned"], plan["open"], today, plan["full_scan"])
+                del plans[rid]
+
+        await closer
+    finally:
+        for t in workers + [closer]:
+            t.cancel()
 
 
 # --------------------------------------------------------------
 # 전체 실행
 # --------------------------------------------------------------
-async def run_all_async():
+async def stream_all_async(on_result, on_facilities=None,
+                           concurrency=CRAWL_CONCURRENCY,
+                           queue_size=RESULT_QUEUE_SIZE,
+                           facility_ids=None,
+                           groups=None,
+                           date_from=None,
+                           date_to=None,
+                           use_profile=True,
+                           stats=None):
     async with aiohttp.ClientSession(
         connector=get_connector(),
         headers=HEADERS
@@ -190,21 +611,192 @@ async def run_all_async():
         # ★ 1) 세션 시작 → 자동 쿠키 갱신
         await init_session(session)
 
-        # ★ 2) 전체 테니스 시설 크롤링
+        # ★ 2) 전체 테니스 시설 크롤링 (+ 시설/그룹 필터)
         facilities = await fetch_facilities(session)
+        if facility_ids:
+            facilities = {rid: f for rid, f in facilities.items() if rid in facility_ids}
+        if groups:
+            facilities = {
+                rid: f for rid, f in facilities.items()
+                if get_court_group(f.get("title", "")) in groups
+            }
+        if on_facilities:
+            on_facilities(facilities)
+
+        # ★ 3) 시설×날짜 결과를 완료 순서대로 스트리밍 (학습된 오픈 범위만)
+        # 시설/그룹/날짜로 좁힌 크롤링은 학습된 범위를 쓰기만 하고 갱신하지 않음
+        # (runs 가 바뀌면 웹 프로세스의 probe 회차도 밀림)
+        learn = use_profile and not (facility_ids or groups or date_from or date_to)
+        if use_profile:
+            load_profiles()
+        if stats is None:
+            stats = {}
+        stats.setdefault("candidates", 0)
+        stats.setdefault("requested", 0)
+        await stream_availability(
+            session, facilities, on_result,
+            concurrency=concurrency,
+            queue_size=queue_size,
+            stats=stats,
+            date_from=date_from,
+            date_to=date_to,
+            use_profile=use_profile,
+            learn=learn
+        )
+        if learn:
+            save_profiles()
+        print(f"[INFO] 날짜 요청 {stats['requested']}/{stats['candidates']}")
+
+        return facilities
+
+
+async def run_all_async():
+    availability = {}
 
-        # ★ 3) 각 시설 날짜 데이터 병렬 처리
-        tasks = [fetch_availability(session, rid) for rid in facilities]
-        results = await asyncio.gather(*tasks)
+    def collect(rid, date_val, slots):
+        availability.setdefault(rid, {})[date_val] = slots
 
-        availability = {
-            rid: data
-            for (rid, _), data in zip(facilities.items(), results)
-            if data
-        }
+    facilities = await stream_all_async(collect)
+    return facilities, availability
 
-        return facilities, availability
+
+def stream_all(on_result, on_facilities=None, **kwargs):
+    return asyncio.run(stream_all_async(on_result, on_facilities, **kwargs))
 
 
 def run_all():
     return asyncio.run(run_all_async())
+
+
+# --------------------------------------------------------------
+# CLI: python -m tennis_core
+# --------------------------------------------------------------
+def parse_date_arg(value):
+    value = value.replace("-", "")
+    if not re.fullmatch(r"\d{8}", value):
+        raise argparse.ArgumentTypeError(f"날짜 형식 오류: {value} (YYYYMMDD / YYYY-MM-DD)")
+    return value
+
+
+def positive_int(value):
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"1 이상의 정수여야 합니다: {value}")
+    return n
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tennis_core",
+        description="용인 공공테니스장 예약 가능 시간 크롤러"
+    )
+    parser.add_argument("--facility", action="append", default=[],
+                        help="시설 resveId (여러 번 지정 가능)")
+    parser.add_argument("--group", action="append", default=[],
+                        help="코트 그룹, 예: 죽전 (여러 번 지정 가능)")
+    parser.add_argument("--from", dest="date_from", type=parse_date_arg,
+                        help="시작 날짜 (포함)")
+    parser.add_argument("--to", dest="date_to", type=parse_date_arg,
+                        help="끝 날짜 (포함)")
+    parser.add_argument("--concurrency", type=positive_int, default=CRAWL_CONCURRENCY,
+                        help=f"동시 요청 수 (기본 {CRAWL_CONCURRENCY})")
+    parser.add_argument("--queue-size", type=positive_int, default=RESULT_QUEUE_SIZE,
+                        help=f"결과 큐 크기 (기본 {RESULT_QUEUE_SIZE})")
+    parser.add_argument("--no-profile", action="store_true",
+                        help="학습된 오픈 범위를 무시하고 모든 날짜 요청")
+    parser.add_argument("--format", choices=["ndjson", "snapshot"], default="ndjson",
+                        help="ndjson: (시설, 날짜) 한 줄씩 / snapshot: /data 형식 JSON 한 개")
+    parser.add_argument("-o", "--output", default="-",
+                        help="출력 파일 (기본 stdout)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    tmp_path = args.output + ".tmp"
+    out = sys.stdout.buffer if args.output == "-" else open(tmp_path, "wb")
+    facilities = {}
+    availability = {}
+    timing = {"results": 0, "slots": 0, "first_result": None}
+    started = time.perf_counter()
+
+    def on_facilities(found):
+        facilities.update(found)
+        timing["facilities"] = time.perf_counter() - started
+
+    def on_result(rid, date_val, slots):
+        if timing["first_result"] is None:
+            timing["first_result"] = time.perf_counter() - started
+        timing["results"] += 1
+        timing["slots"] += len(slots)
+
+        if args.format == "ndjson":
+            title = facilities.get(rid, {}).get("title", "")
+            out.write(json_codec.dumps({
+                "facility": rid,
+                "title": title,
+                "group": get_court_group(title),
+                "date": date_val,
+                "slots": slots,
+            }) + b"\n")
+            out.flush()
+        else:
+            availability.setdefault(rid, {})[date_val] = slots
+
+    stats = {}
+    completed = False
+    # 로그(print) 는 stderr 로 → stdout 은 NDJSON 전용
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            stream_all(
+                on_result,
+                on_facilities,
+                concurrency=args.concurrency,
+                queue_size=args.queue_size,
+                facility_ids=set(args.facility) or None,
+                groups=set(args.group) or None,
+                date_from=args.date_from,
+                date_to=args.date_to,
+                use_profile=not args.no_profile,
+                stats=stats
+            )
+
+        if args.format == "snapshot":
+            out.write(json_codec.dumps({
+                "facilities": facilities,
+                "availability": availability,
+                "updated_at": datetime.now().astimezone().isoformat(),
+            }))
+        completed = True
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+            # 실패하면 반쪽 임시 파일은 지움
+            if not completed:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp_path)
+
+    # 파일은 다 쓴 뒤에 교체 (읽는 쪽이 반쪽 파일을 보지 않도록)
+    if args.output != "-":
+        os.replace(tmp_path, args.output)
+
+    elapsed = time.perf_counter() - started
+    first = timing["first_result"]
+    print(
+        f"[INFO] facilities={len(facilities)} "
+        f"requests={stats.get('requested', 0)}/{stats.get('candidates', 0)} "
+        f"results={timing['results']} slots={timing['slots']} "
+        f"listing={timing.get('facilities', 0):.2f}s "
+        f"first_result={'-' if first is None else f'{first:.2f}s'} "
+        f"total={elapsed:.2f}s "
+        f"({stats.get('requested', 0) / elapsed if elapsed else 0:.0f} req/s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()